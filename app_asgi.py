@@ -0,0 +1,41 @@
+from quart import Quart, request
+import json
+import bank_base
+
+# ASGI twin of app_flask.py. Run it under an ASGI server, e.g.
+#   uvicorn app_asgi:app --host 0.0.0.0 --port 6004
+# so every in-flight conversation is a coroutine rather than a worker thread.
+
+app = Quart(__name__)
+@app.route('/', methods=['GET', 'POST'])
+async def index():
+    if request.method == 'POST':
+        payload = await request.get_json()
+        userId=payload['sender_id']
+        userText=payload['text']
+        try:
+            resp = await bank_base.startAsync(userText,userId)
+        except bank_base.TurnInProgress as e:
+            return {'error':str(e)}, 409
+        return {'text':resp}
+    return ""
+
+# Server-sent events, same format as app_flask.py's /stream.
+@app.route('/stream', methods=['POST'])
+async def stream():
+    payload = await request.get_json()
+    userId=payload['sender_id']
+    userText=payload['text']
+    async def events():
+        try:
+            async for text in bank_base.startStreamAsync(userText,userId):
+                yield ("data: " + json.dumps({'text':text}) + "\n\n").encode()
+        except bank_base.TurnInProgress as e:
+            yield ("data: " + json.dumps({'error':str(e)}) + "\n\n").encode()
+        yield b"data: [DONE]\n\n"
+    return events(), 200, {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=6004, debug=False)
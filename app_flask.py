@@ -1,6 +1,7 @@
-from flask import Flask, request 
+from flask import Flask, Response, request 
+import json
 import requests
-import forBank.bank_base as bank_base
+import bank_base
 
 
 app = Flask(__name__,template_folder='templates') 
@@ -10,7 +11,10 @@ def index():
         print("Hi")
         userId=request.get_json()['sender_id']
         userText=request.get_json()['text']
-        resp = bank_base.start(userText,userId)
+        try:
+            resp = bank_base.start(userText,userId)
+        except bank_base.TurnInProgress as e:
+            return {'error':str(e)}, 409
         print("response that will be sent",resp)
         return {'text':resp}
     # userId=123
@@ -19,6 +23,23 @@ def index():
     # print(resp)
     return ""
 
+# Server-sent events: one `data: {"text": ...}` event per chunk of the reply as
+# the model produces it, then `data: [DONE]`. If a reply to the same sender is
+# still in progress, a single `data: {"error": ...}` event takes the text's place.
+@app.route('/stream', methods=['POST'])
+def stream():
+    userId=request.get_json()['sender_id']
+    userText=request.get_json()['text']
+    def events():
+        try:
+            for text in bank_base.startStream(userText,userId):
+                yield "data: " + json.dumps({'text':text}) + "\n\n"
+        except bank_base.TurnInProgress as e:
+            yield "data: " + json.dumps({'error':str(e)}) + "\n\n"
+        yield "data: [DONE]\n\n"
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
   
 if __name__ == '__main__':
@@ -1,8 +1,25 @@
-from openai import OpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+import asyncio
 import json
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from bank_results import check_last_four, check_pin, shape_balance, shape_deposit, shape_transactions
+from context_window import ContextWindow
+from session_store import MemorySessionStore, SqliteSessionStore
+from token_utils import count_text_tokens
+import transport
 
 api_key = ""
-openai = OpenAI(api_key=api_key)
+# Both clients keep their connections alive in pools sized by transport.py.
+openai = transport.openai_client(api_key)
+asyncOpenai = transport.async_openai_client(api_key)
 
 
 
@@ -26,7 +43,7 @@ def handleAccNum(accNum):
         }
     ]
 
-    funcResp = f"if the 'resCode' in {apiResp} is not '000' or is not present, then tell the user that there is some issue with the server. Else if, 'resCode' is '000' and  the last 4 digits of any of the 'value' provided in 'responseData' strictly matches with {accNum},then tell user to provide 4 digits pin number. Else tell him to provide the correct last 4 digits of account number."
+    funcResp = check_last_four(apiResp, accNum, "account", "resCode")
 
     return funcResp
 
@@ -52,7 +69,7 @@ def handleCardNum(cardNum):
                     "responseData": [{"key": "4988750201801808", "value": "498875******1808"}],
                 }
               ]
-    funcResp = f"if the 'respCode' in {apiResp} is not '000' or is not present, then tell the user that there is some issue with the server. Else if, 'respCode' is '000' and  the last 4 digits of any of the 'value' provided in 'responseData' strictly matches with {cardNum},then tell user to provide 4 digits pin number. Else tell him to provide the correct last 4 digits of card number."
+    funcResp = check_last_four(apiResp, cardNum, "card", "respCode")
 
     return funcResp
 
@@ -61,10 +78,8 @@ def handleCardNum(cardNum):
 def handlePinNumForAccBalanceTransaction(pinNum , operation):
     apiResp =  [{'gmsg': 'OK', 'gstatus': True, 'gcode': 200, 'gmcode': 3035, 'gmmsg': 'Verify Tpin unable to read', 'gdata': [], 'Status': 'Successful', 'Reason': 'Correct TPIN'}]
 
-    if apiResp[0]["Status"]!="Successful" or (not(apiResp)):
-        funcResp = f"the 'Status' in {apiResp} is unsuccessful, inform user about 'Reason'. Else tell user that there is server issuse."
-
-    else:
+    funcResp = check_pin(apiResp)
+    if funcResp is None:
         if (operation=='Balance'):
             apiRespBalance = [
                                 {
@@ -107,7 +122,7 @@ def handlePinNumForAccBalanceTransaction(pinNum , operation):
                                     ],
                                 }
                             ]
-            funcResp = f"if the 'resCode' in {apiRespBalance} is not '000' or is not present, then tell the user that there is some issue with the Balance server. Else if, 'resCode' is '000' and  provide user 'currentBalance' in 'responseData'."
+            funcResp = shape_balance(apiRespBalance)
 
         elif operation=="Transaction":
             apiRespTransaction = [
@@ -180,19 +195,17 @@ def handlePinNumForAccBalanceTransaction(pinNum , operation):
                                         },
                                     }
                                  ]
-            funcResp = f"if the 'resCode' in {apiRespTransaction} is not '000' or is not present, then tell the user that there is some issue with the Transaction server. Else if, 'resCode' is '000', then  provide user the 'transactionDate', 'transactionType' and amount of transaction from('withdrawal' or 'deposit') based on 'transactionType' of the last 5 transaction from 'responseData',  for each of the transaction give response in the given format, 'Hundred Taka was credited on April sixth, Two Thousand Twenty Four.', that is use words to make up sentence using the informations."
+            funcResp = shape_transactions(apiRespTransaction)
 
 
-        return funcResp
+    return funcResp
     
 
 def handlePinNumForAccFdrDps(pinNum , operation):
     apiResp =  [{'gmsg': 'OK', 'gstatus': True, 'gcode': 200, 'gmcode': 3035, 'gmmsg': 'Verify Tpin unable to read', 'gdata': [], 'Status': 'Successful', 'Reason': 'Correct TPIN'}]
 
-    if apiResp[0]["Status"]!="Successful" or (not(apiResp)):
-        funcResp = f"the 'Status' in {apiResp} is unsuccessful, inform user about 'Reason'. Else tell user that there is server issuse."
-
-    else:
+    funcResp = check_pin(apiResp)
+    if funcResp is None:
         if (operation=='FDR'):
             apiResp = [
                                 {
@@ -295,20 +308,16 @@ def handlePinNumForAccFdrDps(pinNum , operation):
                                     ],
                                 }
                              ]
-        funcResp = f"""The response for {operation} related to the account is : {apiResp}\
-If the 'resCode' in it is not '000' or is not present, then tell the user there is some issue with {operation} server.\
-Else if 'resCode' is '000, then give response to the user according to the specific information he wants to know about {operation} using 'responseData', If no specific information available in 'responseData' is mentioned, ask hem to specify. For example, the response format for all language should be like 'The maturity date of your {operation} is sisth november, two thousand twenty four', that is use words to make sentences, dont ue digits in your response."""
+        funcResp = shape_deposit(apiResp, operation)
 
-        return funcResp
+    return funcResp
     
 
 def handlePinNumForCard(pinNum , operation):
     apiResp =  [{'gmsg': 'OK', 'gstatus': True, 'gcode': 200, 'gmcode': 3035, 'gmmsg': 'Verify Tpin unable to read', 'gdata': [], 'Status': 'Successful', 'Reason': 'Correct TPIN'}]
 
-    if apiResp[0]["Status"]!="Successful" or (not(apiResp)):
-        funcResp = f"the 'Status' in {apiResp} is unsuccessful, inform user about 'Reason'. Else tell user that there is server issuse."
-
-    else:
+    funcResp = check_pin(apiResp)
+    if funcResp is None:
         if (operation=='Balance'):
             apiRespBalance = [
                                 {
@@ -351,7 +360,7 @@ def handlePinNumForCard(pinNum , operation):
                                     ],
                                 }
                             ]
-            funcResp = f"if the 'resCode' in {apiRespBalance} is not '000' or is not present, then tell the user that there is some issue with the Balance server. Else if, 'resCode' is '000' and  provide user 'currentBalance' in 'responseData'."
+            funcResp = shape_balance(apiRespBalance)
 
         elif operation=="Transaction":
             apiRespTransaction = [
@@ -424,127 +433,97 @@ def handlePinNumForCard(pinNum , operation):
                                         },
                                     }
                                  ]
-            funcResp = f"if the 'resCode' in {apiRespTransaction} is not '000' or is not present, then tell the user that there is some issue with the Transaction server. Else if, 'resCode' is '000', then  provide user the 'transactionDate', 'transactionType' and amount of transaction from('withdrawal' or 'deposit') based on 'transactionType' of the last 5 transaction from 'responseData', for each of the transaction give response in the given format, 'Hundred Taka was credited on April sixth, Two Thousand Twenty Four.', that is use words to make up sentence using the informations."
+            funcResp = shape_transactions(apiRespTransaction)
 
 
-        return funcResp
+    return funcResp
     
         
-tools = [
+# Tool arguments. Each model is both the JSON schema sent to the model and the
+# validator its arguments are parsed with.
+class AccNumArgs(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    accNum: str = Field(..., description="Last four digits of account number.")
+
+class CardNumArgs(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    cardNum: str = Field(..., description="Last four digits of card number.")
+
+class AccPinArgs(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    pinNum: str = Field(..., description="User provided pin number of account.")
+    operation: Literal["Balance", "Transaction"] = Field(..., description="Type of opoeration to be performed on account, e.g., Balance. Infer this from what user wants to know about account Balance or Transaction  related to account.")
+
+class AccFdrDpsPinArgs(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    pinNum: str = Field(..., description="User provided pin number of account.")
+    operation: Literal["DPS", "FDR"] = Field(..., description="Type of opoeration to be performed on account, e.g., DPS. Infer this from what user wants to know about DPS or FDR related to account.")
+
+class CardPinArgs(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    pinNum: str = Field(..., description="User provided pin number of card.")
+    operation: Literal["Balance", "Transaction"] = Field(..., description="Type of opoeration to be performed on card, e.g., Balance. Infer this from what user wants to know about card.")
+
+# Result serializers: turn (validated args, handler result) into tool message content.
+def withArgs(args, functionResp):
+    return json.dumps({**args.model_dump(), "function_response": functionResp})
+
+def withoutPin(args, functionResp):
+    # The PIN has done its job once verified; don't keep it in the history.
+    return json.dumps({**args.model_dump(exclude={"pinNum"}), "function_response": functionResp})
+
+ToolSpec = namedtuple("ToolSpec", ["handler", "argsModel", "serializer", "description"])
+
+toolRegistry = {
     #Functions for Account
         #For validating last 4 digits of account number
-    {
-       "type": "function",
-        "function": {
-            "name": "handleAccNum",
-            "description": "If the user wants to know his (account balance, DPS, FDR or the last five transaction of his account), then first ask him about the last 4 digits of his account number. If the provided last 4 digits of account number is wrong ask for the correct last 4 digits of account number again. Call this function when you need to validate user provided last 4 digits of his account number.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "accNum": {
-                        "type": "string",
-                        "description": "Last four digits of account number.",
-                    },
-                },
-                "required": ["accNum"],
-                "additionalProperties": False,
-            },
-        }
-    },
+    "handleAccNum": ToolSpec(
+        handleAccNum, AccNumArgs, withArgs,
+        "If the user wants to know his (account balance, DPS, FDR or the last five transaction of his account), then first ask him about the last 4 digits of his account number. If the provided last 4 digits of account number is wrong ask for the correct last 4 digits of account number again. Call this function when you need to validate user provided last 4 digits of his account number.",
+    ),
         #For validating pin number of account for balance and last 5 transactions
-    {
-       "type": "function",
-        "function": {
-            "name": "handlePinNumForAccBalanceTransaction",
-            "description": "Call this function after the user has already provided the correct last 4 digits of account number, and then user provided his 4 digit pin number of account.   Call this function when customer wants to know about account balance or last 5 transactions of account and you need to validate pin number of account.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "pinNum": {
-                        "type": "string",
-                        "description": "User provided pin number of account.",
-                    },
-                    "operation": {
-                        "type": "string",
-                        "enum": ["Balance", "Transaction"],
-                        "description": "Type of opoeration to be performed on account, e.g., Balance. Infer this from what user wants to know about account Balance or Transaction  related to account.",
-                    },
-                },
-                "required": ["pinNum", "operation"],
-                "additionalProperties": False,
-            },
-        }
-    },
+    "handlePinNumForAccBalanceTransaction": ToolSpec(
+        handlePinNumForAccBalanceTransaction, AccPinArgs, withoutPin,
+        "Call this function after the user has already provided the correct last 4 digits of account number, and then user provided his 4 digit pin number of account.   Call this function when customer wants to know about account balance or last 5 transactions of account and you need to validate pin number of account.",
+    ),
         #For validating pin number of account for DPS and FDR
-    {
-       "type": "function",
-        "function": {
-            "name": "handlePinNumForAccFdrDps",
-            "description": "Call this function after the user has already provided the correct last 4 digits of account number and then user provided his 4 digit pin number of account. Call this function when customer wants to know about DPS or FDR information of account and you need to validate pin number of account.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "pinNum": {
-                        "type": "string",
-                        "description": "User provided pin number of account.",
-                    },
-                    "operation": {
-                        "type": "string",
-                        "enum": ["DPS", "FDR"],
-                        "description": "Type of opoeration to be performed on account, e.g., DPS. Infer this from what user wants to know about DPS or FDR related to account.",
-                    },
-                },
-                "required": ["pinNum", "operation"],
-                "additionalProperties": False,
-            },
-        }
-    },
+    "handlePinNumForAccFdrDps": ToolSpec(
+        handlePinNumForAccFdrDps, AccFdrDpsPinArgs, withoutPin,
+        "Call this function after the user has already provided the correct last 4 digits of account number and then user provided his 4 digit pin number of account. Call this function when customer wants to know about DPS or FDR information of account and you need to validate pin number of account.",
+    ),
 
     #Functions for Card
         #For validating last 4 digits of card number
-    {
-       "type": "function",
-        "function": {
-            "name": "handleCardNum",
-            "description": "If the user wants to know his card balance first ask him about the last 4 digits of his card number. If the provided last 4 digits of card number is wrong ask for the correct last 4 digits of card number again. Call this function when you need to validate user provided last 4 digits of his card number.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "cardNum": {
-                        "type": "string",
-                        "description": "Last four digits of card number.",
-                    },
-                },
-                "required": ["cardNum"],
-                "additionalProperties": False,
-            },
-        }
-    },
+    "handleCardNum": ToolSpec(
+        handleCardNum, CardNumArgs, withArgs,
+        "If the user wants to know his card balance first ask him about the last 4 digits of his card number. If the provided last 4 digits of card number is wrong ask for the correct last 4 digits of card number again. Call this function when you need to validate user provided last 4 digits of his card number.",
+    ),
         #For validating pin number of card
+    "handlePinNumForCard": ToolSpec(
+        handlePinNumForCard, CardPinArgs, withoutPin,
+        "Call this function after the user has already provided the correct last 4 digits of card number and then user provided his 4 digit pin number of card. Call this function when you need to validate pin number for card.",
+    ),
+}
+
+def stripTitles(schema):
+    # pydantic adds a "title" to every node; the model doesn't need them.
+    if isinstance(schema, dict):
+        return {key: stripTitles(value) for key, value in schema.items() if key != "title"}
+    if isinstance(schema, list):
+        return [stripTitles(value) for value in schema]
+    return schema
+
+# Built once at import from the registry, so schemas can't drift from dispatch.
+tools = [
     {
-       "type": "function",
+        "type": "function",
         "function": {
-            "name": "handlePinNumForCard",
-            "description": "Call this function after the user has already provided the correct last 4 digits of card number and then user provided his 4 digit pin number of card. Call this function when you need to validate pin number for card.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "pinNum": {
-                        "type": "string",
-                        "description": "User provided pin number of card.",
-                    },
-                    "operation": {
-                        "type": "string",
-                        "enum": ["Balance", "Transaction"],
-                        "description": "Type of opoeration to be performed on card, e.g., Balance. Infer this from what user wants to know about card.",
-                    },
-                },
-                "required": ["pinNum", "operation"],
-                "additionalProperties": False,
-            },
+            "name": name,
+            "description": spec.description,
+            "parameters": stripTitles(spec.argsModel.model_json_schema()),
         }
-    },
-    
+    }
+    for name, spec in toolRegistry.items()
 ]
 
 systemPrompt = [
@@ -560,7 +539,28 @@ response = openai.chat.completions.create(
     tools=tools,
 )
 """
-messageHistory={}
+# Conversations live in a bounded store (LRU + idle TTL + per-session byte cap)
+# instead of an ever-growing dict. Set BANK_SESSION_DB to a file path to page
+# idle sessions out to SQLite rather than dropping them.
+if os.environ.get("BANK_SESSION_DB"):
+    messageHistory = SqliteSessionStore(os.environ["BANK_SESSION_DB"])
+else:
+    messageHistory = MemorySessionStore()
+
+# Only the system prompt and the newest turns that fit in this many tokens
+# (tool schemas included) are sent to the model on each completion.
+contextWindow = ContextWindow(budget_tokens=int(os.environ.get("BANK_CONTEXT_TOKENS", "4000")))
+
+@lru_cache(maxsize=None)
+def toolSchemaTokens():
+    # Counted on first use rather than at import, which would load (and maybe download) the encoder.
+    return count_text_tokens(json.dumps(tools))
+
+# Prompt tokens per completion: our estimate and what the API reported.
+promptTokenLog = deque(maxlen=1000)
+# Tool handlers are blocking core-banking calls; all the calls the model makes
+# in one response run side by side here.
+toolExecutor = ThreadPoolExecutor(max_workers=int(os.environ.get("BANK_TOOL_WORKERS", "16")))
 
 #print(response)
 
@@ -568,19 +568,38 @@ messageHistory={}
 #print("\n")
 #print(response.choices[0].message.content)
 
-def start(userText,userId):
-    print("in openai")
-    if userId not in messageHistory:
-        messageHistory[userId] =[
+# One turn at a time per user: a second request while a reply is still being
+# written is turned away (the apps answer 409) instead of interleaving its
+# messages with the first one's.
+class TurnInProgress(Exception):
+    pass
+
+activeTurns = set()
+activeTurnsLock = threading.Lock()
+
+def beginTurn(userId):
+    with activeTurnsLock:
+        if str(userId) in activeTurns:
+            raise TurnInProgress(f"A reply to {userId} is still in progress")
+        activeTurns.add(str(userId))
+
+def endTurn(userId):
+    with activeTurnsLock:
+        activeTurns.discard(str(userId))
+
+def getMessages(userText,userId):
+    # A copy: the turn works on its own list and only saves it once it completes,
+    # so a failed model or tool call leaves the stored history as it was.
+    messages = messageHistory.load(userId)
+    if messages is not None:
+        messages = list(messages)
+    else:
+        messages =[
                                     {
                                         "role": "system",
                                         "content": "You are a helpful customer support assistant who serves customers with their account or card information. If the customer asks information(skip for dps and fdr it is related to account always) without specifying category(account or card), tell him to specify the category. Use the supplied tools to assist the user. You need to follow all the provided instructions strictly as the information are sensetive. Do not add any note in you response. If user query is in benglai language reply in that same language."
                                     }
                                 ]
-        messages = messageHistory[userId]
-        #print(messageHistory)
-    else:
-        messages = messageHistory[userId]
 
     userInput = userText
     temp = {
@@ -588,11 +607,93 @@ def start(userText,userId):
         "content": userInput
     }
     messages.append(temp)
+    return messages
+
+def recordPromptTokens(userId,window,response):
+    billed = response.usage.prompt_tokens if response.usage else None
+    promptTokenLog.append({
+        "userId": userId,
+        "estimated": window.prompt_tokens,
+        "billed": billed,
+        "dropped": window.dropped,
+    })
+    print("prompt tokens:", window.prompt_tokens, "estimated,", billed, "billed,", window.dropped, "older messages left out")
+
+def callTool(toolCall):
+    functionName = toolCall.function.name
+    argument = toolCall.function.arguments
+
+    print("--------------------", functionName, argument)
+
+    spec = toolRegistry.get(functionName)
+    if spec is None:
+        raise ValueError(f"Unknown tool: {functionName}")
+    args = spec.argsModel.model_validate_json(argument)
+    functionResp = spec.handler(**args.model_dump())
+    function_call_result_message = {
+        "role": "tool",
+        "content": spec.serializer(args, functionResp),
+        "tool_call_id": toolCall.id
+    }
+
+    return function_call_result_message
+
+def runToolCall(toolCall):
+    # Every tool call needs a matching tool message, even when the handler fails.
+    if toolCall.function.name not in toolRegistry:
+        # A misspelled or made-up tool: tell the model which ones exist so it can retry.
+        return {
+            "role": "tool",
+            "content": json.dumps({"status": "unknown_tool", "tool": toolCall.function.name,
+                                   "available_tools": list(toolRegistry)}),
+            "tool_call_id": toolCall.id
+        }
+    try:
+        return callTool(toolCall)
+    except ValidationError as e:
+        # Let the model see what was wrong so it can ask the user again.
+        return {
+            "role": "tool",
+            "content": json.dumps({
+                "status": "invalid_arguments",
+                "errors": [{"field": ".".join(map(str, err["loc"])), "error": err["msg"]} for err in e.errors()],
+            }),
+            "tool_call_id": toolCall.id
+        }
+    except Exception as e:
+        print("Tool call failed:", toolCall.function.name, e)
+        return {
+            "role": "tool",
+            "content": json.dumps({"status": "error", "instruction": "Tell the user there is some issue with the server."}),
+            "tool_call_id": toolCall.id
+        }
+
+def runToolCalls(toolCalls):
+    if len(toolCalls) == 1:
+        return [runToolCall(toolCalls[0])]
+    return list(toolExecutor.map(runToolCall, toolCalls))
+
+async def runToolCallsAsync(toolCalls):
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(toolExecutor, runToolCall, toolCall) for toolCall in toolCalls))
+
+def start(userText,userId):
+    beginTurn(userId)
+    try:
+        return startTurn(userText,userId)
+    finally:
+        endTurn(userId)
+
+def startTurn(userText,userId):
+    print("in openai")
+    messages = getMessages(userText,userId)
+    window = contextWindow.fit(messages, toolSchemaTokens())
     response = openai.chat.completions.create(
         model="gpt-4o",
-        messages=messages,
+        messages=window.messages,
         tools=tools,
     )
+    recordPromptTokens(userId,window,response)
     print("*"*50)
     print(response)
     print("*"*50)
@@ -600,91 +701,18 @@ def start(userText,userId):
     if (response.choices[0].finish_reason == "tool_calls"):
         print("Model made a tool call.")
         print(response.choices[0].message.tool_calls)
-        functionName = response.choices[0].message.tool_calls[0].function.name
-        argument = response.choices[0].message.tool_calls[0].function.arguments
-        
-        print("--------------------", functionName, argument)
-
-        if functionName == "handleAccNum":
-            argJson = json.loads(argument)
-            functionResp = handleAccNum(argJson['accNum'])
-            function_call_result_message = {
-                "role": "tool",
-                "content": json.dumps(
-                    {
-                        "accNum": argJson['accNum'],
-                        "function_response": functionResp
-                    }
-                ),
-                "tool_call_id": response.choices[0].message.tool_calls[0].id
-            }
-            
-        elif  functionName == "handleCardNum":
-            argJson = json.loads(argument)
-            functionResp = handleCardNum(argJson['cardNum'])
-            function_call_result_message = {
-                "role": "tool",
-                "content": json.dumps(
-                    {
-                        "cardNum": argJson['cardNum'],
-                        "function_response": functionResp
-                    }
-                ),
-                "tool_call_id": response.choices[0].message.tool_calls[0].id
-            }
-
-        elif  functionName == "handlePinNumForAccBalanceTransaction":
-            argJson = json.loads(argument)
-            functionResp = handlePinNumForAccBalanceTransaction(argJson['pinNum'],argJson['operation'])
-            function_call_result_message = {
-                "role": "tool",
-                "content": json.dumps(
-                    {
-                        "pinNum": argJson['pinNum'],
-                        "operation":argJson['operation'],
-                        "function_response": functionResp
-                    }
-                ),
-                "tool_call_id": response.choices[0].message.tool_calls[0].id
-            }
-        elif  functionName == "handlePinNumForAccFdrDps":
-            argJson = json.loads(argument)
-            functionResp = handlePinNumForAccFdrDps(argJson['pinNum'],argJson['operation'])
-            function_call_result_message = {
-                "role": "tool",
-                "content": json.dumps(
-                    {
-                        "pinNum": argJson['pinNum'],
-                        "operation":argJson['operation'],
-                        "function_response": functionResp
-                    }
-                ),
-                "tool_call_id": response.choices[0].message.tool_calls[0].id
-            }
-        elif  functionName == "handlePinNumForCard":
-            argJson = json.loads(argument)
-            functionResp = handlePinNumForCard(argJson['pinNum'],argJson['operation'])
-            function_call_result_message = {
-                "role": "tool",
-                "content": json.dumps(
-                    {
-                        "pinNum": argJson['pinNum'],
-                        "operation":argJson['operation'],
-                        "function_response": functionResp
-                    }
-                ),
-                "tool_call_id": response.choices[0].message.tool_calls[0].id
-            }
-        
+        function_call_result_messages = runToolCalls(response.choices[0].message.tool_calls)
         
         messages.append(response.choices[0].message)
-        print(function_call_result_message)
-        messages.append(function_call_result_message)
+        print(function_call_result_messages)
+        messages.extend(function_call_result_messages)
         print(messages)
+        window = contextWindow.fit(messages)
         res2 = openai.chat.completions.create(
             model="gpt-4o",
-            messages=messages,
+            messages=window.messages,
         )
+        recordPromptTokens(userId,window,res2)
         aiResp = res2.choices[0].message.content
         temp2 = {
             "role": "assistant",
@@ -701,4 +729,186 @@ def start(userText,userId):
         }
         messages.append(temp2)
         print("OpenAI: ", aiResp)
-    return aiResp
\ No newline at end of file
+    messageHistory.save(userId,messages)
+    return aiResp
+
+# Same turn as start(), but awaits the model so an ASGI server can keep many
+# conversations in flight on one event loop instead of one thread each.
+async def startAsync(userText,userId):
+    beginTurn(userId)
+    try:
+        return await startAsyncTurn(userText,userId)
+    finally:
+        endTurn(userId)
+
+async def startAsyncTurn(userText,userId):
+    print("in openai (async)")
+    messages = getMessages(userText,userId)
+    window = contextWindow.fit(messages, toolSchemaTokens())
+    response = await asyncOpenai.chat.completions.create(
+        model="gpt-4o",
+        messages=window.messages,
+        tools=tools,
+    )
+    recordPromptTokens(userId,window,response)
+    if (response.choices[0].finish_reason == "tool_calls"):
+        print("Model made a tool call.")
+        function_call_result_messages = await runToolCallsAsync(response.choices[0].message.tool_calls)
+
+        messages.append(response.choices[0].message)
+        messages.extend(function_call_result_messages)
+        window = contextWindow.fit(messages)
+        res2 = await asyncOpenai.chat.completions.create(
+            model="gpt-4o",
+            messages=window.messages,
+        )
+        recordPromptTokens(userId,window,res2)
+        aiResp = res2.choices[0].message.content
+    else:
+        aiResp = response.choices[0].message.content
+
+    temp2 = {
+        "role": "assistant",
+        "content": aiResp
+    }
+    messages.append(temp2)
+    print("OpenAI: ", aiResp)
+    messageHistory.save(userId,messages)
+    return aiResp
+
+# Streaming turns. The first completion streams too: if the model answers
+# directly its words reach the user as they are generated, and if it calls
+# tools the call fragments are stitched back together here before running them.
+class StreamedReply:
+    def __init__(self):
+        self.parts = []
+        self.toolCalls = {}
+        self.usage = None
+
+    def add(self, chunk):
+        """Fold one chunk in and return its text delta, if any."""
+        if chunk.usage:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta
+        for fragment in delta.tool_calls or []:
+            call = self.toolCalls.setdefault(fragment.index, {
+                "id": "",
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function:
+                call["function"]["name"] += fragment.function.name or ""
+                call["function"]["arguments"] += fragment.function.arguments or ""
+        if delta.content:
+            self.parts.append(delta.content)
+            return delta.content
+        return None
+
+    @property
+    def content(self):
+        return "".join(self.parts)
+
+    def toolCallList(self):
+        return [ChatCompletionMessageToolCall.model_validate(self.toolCalls[i]) for i in sorted(self.toolCalls)]
+
+    def message(self):
+        return {
+            "role": "assistant",
+            "content": self.content or None,
+            "tool_calls": [self.toolCalls[i] for i in sorted(self.toolCalls)]
+        }
+
+def streamArgs(window,withTools):
+    args = {
+        "model": "gpt-4o",
+        "messages": window.messages,
+        "stream": True,
+        # Ask for a last chunk carrying usage so recordPromptTokens still works.
+        "stream_options": {"include_usage": True},
+    }
+    if withTools:
+        args["tools"] = tools
+    return args
+
+def startStream(userText,userId):
+    """Like start(), but yields the reply text as it arrives."""
+    beginTurn(userId)
+    try:
+        yield from startStreamTurn(userText,userId)
+    finally:
+        endTurn(userId)
+
+def startStreamTurn(userText,userId):
+    print("in openai (stream)")
+    messages = getMessages(userText,userId)
+    window = contextWindow.fit(messages, toolSchemaTokens())
+    reply = StreamedReply()
+    for chunk in openai.chat.completions.create(**streamArgs(window,True)):
+        text = reply.add(chunk)
+        if text:
+            yield text
+    recordPromptTokens(userId,window,reply)
+    if reply.toolCalls:
+        print("Model made a tool call.")
+        function_call_result_messages = runToolCalls(reply.toolCallList())
+        messages.append(reply.message())
+        messages.extend(function_call_result_messages)
+        window = contextWindow.fit(messages)
+        reply = StreamedReply()
+        for chunk in openai.chat.completions.create(**streamArgs(window,False)):
+            text = reply.add(chunk)
+            if text:
+                yield text
+        recordPromptTokens(userId,window,reply)
+
+    aiResp = reply.content
+    messages.append({
+        "role": "assistant",
+        "content": aiResp
+    })
+    print("OpenAI: ", aiResp)
+    messageHistory.save(userId,messages)
+
+async def startStreamAsync(userText,userId):
+    """Like startAsync(), but yields the reply text as it arrives."""
+    beginTurn(userId)
+    try:
+        async for text in startStreamAsyncTurn(userText,userId):
+            yield text
+    finally:
+        endTurn(userId)
+
+async def startStreamAsyncTurn(userText,userId):
+    print("in openai (async stream)")
+    messages = getMessages(userText,userId)
+    window = contextWindow.fit(messages, toolSchemaTokens())
+    reply = StreamedReply()
+    async for chunk in await asyncOpenai.chat.completions.create(**streamArgs(window,True)):
+        text = reply.add(chunk)
+        if text:
+            yield text
+    recordPromptTokens(userId,window,reply)
+    if reply.toolCalls:
+        print("Model made a tool call.")
+        function_call_result_messages = await runToolCallsAsync(reply.toolCallList())
+        messages.append(reply.message())
+        messages.extend(function_call_result_messages)
+        window = contextWindow.fit(messages)
+        reply = StreamedReply()
+        async for chunk in await asyncOpenai.chat.completions.create(**streamArgs(window,False)):
+            text = reply.add(chunk)
+            if text:
+                yield text
+        recordPromptTokens(userId,window,reply)
+
+    aiResp = reply.content
+    messages.append({
+        "role": "assistant",
+        "content": aiResp
+    })
+    print("OpenAI: ", aiResp)
+    messageHistory.save(userId,messages)
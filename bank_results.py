@@ -0,0 +1,107 @@
+"""
+Result shaping for the bank bot's tools.
+
+The core-banking responses carry dozens of fields the model never needs. These
+helpers check the status codes in Python and reduce each response to the few
+fields the operation is about, so a tool result costs tens of tokens instead of
+the whole raw payload, and the model is left only with the wording.
+"""
+
+SAY_IN_WORDS = "Say amounts and dates in words, not digits."
+
+
+def first(api_resp):
+    return api_resp[0] if api_resp else {}
+
+
+def server_error(service=None):
+    name = f"{service} server" if service else "server"
+    return {"status": "server_error", "instruction": f"Tell the user there is some issue with the {name}."}
+
+
+def clean(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def check_last_four(api_resp, last_four, kind, code_key="resCode"):
+    """Validate the last 4 digits of an account or card number."""
+    resp = first(api_resp)
+    if resp.get(code_key) != "000":
+        return server_error()
+    for row in resp.get("responseData", []):
+        if str(row.get("value", ""))[-4:] == str(last_four).strip():
+            return {"status": "verified", "instruction": "Ask the user for their 4 digit PIN number."}
+    return {"status": "mismatch", "instruction": f"Ask the user for the correct last 4 digits of their {kind} number."}
+
+
+def check_pin(api_resp):
+    """Return None if the PIN was accepted, otherwise the result to send back."""
+    resp = first(api_resp)
+    if not resp:
+        return server_error()
+    if resp.get("Status") != "Successful":
+        return {"status": "pin_failed", "reason": resp.get("Reason"),
+                "instruction": "Tell the user the PIN could not be verified and why."}
+    return None
+
+
+def shape_balance(api_resp):
+    resp = first(api_resp)
+    if resp.get("resCode") != "000" or not resp.get("responseData"):
+        return server_error("Balance")
+    account = resp["responseData"][0]
+    return {
+        "status": "ok",
+        "currentBalance": clean(account.get("currentBalance")),
+        "currency": account.get("currencyCode"),
+        "instruction": "Tell the user their current balance. " + SAY_IN_WORDS,
+    }
+
+
+def shape_transactions(api_resp, limit=5):
+    resp = first(api_resp)
+    if resp.get("resCode") != "000":
+        return server_error("Transaction")
+    rows = resp.get("responseData") or {}
+    # Rows are keyed "1", "2", ... with "1" the most recent.
+    ordered = [rows[key] for key in sorted(rows, key=int)][:limit]
+    transactions = []
+    for row in ordered:
+        credited = row.get("transactionType") == "Cr"
+        transactions.append({
+            "date": row.get("transactionDate"),
+            "type": "credited" if credited else "debited",
+            "amount": clean(row.get("deposit") if credited else row.get("withdrawal")),
+            "currency": row.get("currencyName"),
+        })
+    return {
+        "status": "ok",
+        "transactions": transactions,
+        "instruction": "Give one sentence per transaction, like 'Hundred Taka was credited on April sixth, Two Thousand Twenty Four.' " + SAY_IN_WORDS,
+    }
+
+
+MATURITY_FIELDS = (
+    "productName", "maturityDate", "maturityAmount", "renewalDate", "intRate",
+    "termMonth", "availableBalance", "nextIntPayableDate",
+)
+DEPOSIT_FIELDS = {
+    "FDR": MATURITY_FIELDS,
+    "DPS": MATURITY_FIELDS + (
+        "installmentAmount", "noOfPaidInstallment", "noOfUnpaidInstallment", "nextInstallmentDate",
+    ),
+}
+
+
+def shape_deposit(api_resp, operation):
+    """FDR / DPS details, limited to the maturity and installment fields."""
+    resp = first(api_resp)
+    if resp.get("resCode") != "000" or not resp.get("responseData"):
+        return server_error(operation)
+    account = resp["responseData"][0]
+    details = {field: clean(account[field]) for field in DEPOSIT_FIELDS[operation] if clean(account.get(field))}
+    return {
+        "status": "ok",
+        operation: details,
+        "instruction": f"Answer the specific {operation} detail the user asked about; if they did not say which, ask them. " + SAY_IN_WORDS,
+    }
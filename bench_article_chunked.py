@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Latency of classifying a long article in one call (generate_json_for_article's
+request) against sentiment.py's chunked map-reduce (classify_article_chunked),
+as the article grows, on model_stub.py.
+
+Usage:
+    python bench_article_chunked.py --tokens 4000 16000 64000 --chunk-tokens 2000
+
+The stub takes --latency per call plus --input-token-latency per prompt token
+and --output-token-latency per generated token, so a long prompt is slow the
+way it is from the model. The articles are generated: sections under
+"== Heading ==" lines, paragraphs of sentences, about --tokens tokens each.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from loadtest_bank import spawn, wait_for_port
+from token_utils import count_text_tokens
+
+STUB_PORT = 8795
+CONTEXT_WINDOW = 128000
+WORDS = ("the river trade empire harvest council railway treaty festival coast "
+         "museum league winter engine village charter market harbour dynasty census").split()
+
+
+def make_article(tokens, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < tokens:
+        section = [f"== {rng.choice(WORDS).title()} {rng.choice(WORDS)} ==", ""]
+        for _ in range(rng.randint(2, 6)):
+            sentences = (" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                         for _ in range(rng.randint(3, 8)))
+            section += [" ".join(sentences), ""]
+        lines += section
+        total += count_text_tokens("\n".join(section)) + 1
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-call vs chunked article classification latency")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[4000, 16000, 64000], help="Article sizes")
+    parser.add_argument("--chunk-tokens", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="Sections classified at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="Stubbed model latency per call in seconds")
+    parser.add_argument("--input-token-latency", type=float, default=0.00005, help="Stubbed seconds per prompt token")
+    parser.add_argument("--output-token-latency", type=float, default=0.01, help="Stubbed seconds per generated token")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    # sentiment.py builds its client at import, so it comes after the environment.
+    import sentiment
+
+    articles = [make_article(tokens) for tokens in args.tokens]
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency),
+                  "--input-token-latency", str(args.input_token_latency),
+                  "--output-token-latency", str(args.output_token_latency)], dict(os.environ))
+    rows = []
+    try:
+        wait_for_port(STUB_PORT)
+        for article in articles:
+            started = time.perf_counter()
+            sentiment.client.chat.completions.create(**sentiment.classification_request(article))
+            single = time.perf_counter() - started
+            started = time.perf_counter()
+            result = asyncio.run(sentiment.classify_article_chunked(
+                article, args.chunk_tokens, concurrency=args.concurrency))
+            rows.append((count_text_tokens(article), single, time.perf_counter() - started, result))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"latency {args.latency}s per call + {args.input_token_latency}s per prompt token "
+          f"+ {args.output_token_latency}s per output token, chunks of {args.chunk_tokens} tokens, "
+          f"concurrency {args.concurrency}\n")
+    print(f"{'article tokens':>14} {'one call':>10} {'chunked':>10} {'chunks':>7} {'calls':>6}")
+    ok = True
+    for tokens, single, chunked, result in rows:
+        ok = ok and result is not None and result["failed_chunks"] == 0
+        note = "  (over a 128k context window)" if tokens > CONTEXT_WINDOW else ""
+        chunks = result["chunks"] if result else 0
+        print(f"{tokens:>14} {single:>9.2f}s {chunked:>9.2f}s {chunks:>7} {chunks + 1:>6}{note}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
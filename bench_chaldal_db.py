@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Lookup benchmark for the Chaldal support bot's FakeDatabase: the old linear
+scans against the hash indexes, on generated catalogs of growing size.
+
+Usage:
+    python bench_chaldal_db.py --sizes 1000 10000 100000 1000000
+    python bench_chaldal_db.py --sqlite --sizes 1000 1000000
+
+Each size is that many customers and that many orders. Times are per call,
+for random keys that exist; scans get fewer calls, since one scan of a
+million rows already takes tens of milliseconds.
+
+--sqlite also times the same lookups through SqliteOrderRepository, and has
+several processes race to cancel the same orders to check that each order is
+cancelled exactly once.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from chaldal_repository import CANCELLED, USER_KEYS, SqliteOrderRepository
+from custom_support_chaldal import FakeDatabase
+
+PRODUCTS = ["Wireless Headphones", "Smartphone Case", "Bluetooth Speaker", "Fitness Tracker",
+            "Laptop Sleeve", "Wireless Mouse", "Gaming Keyboard", "Portable Charger", "Smartwatch"]
+STATUSES = ["Processing", "Shipped", "Delivered"]
+
+
+def generate_catalog(customer_count, order_count, seed=7):
+    """Customers and orders shaped like FakeDatabase's, with unique ids and user keys."""
+    rng = random.Random(seed)
+    customers = [
+        {"id": f"C{i:08d}", "name": f"Customer {i}", "email": f"user{i}@example.com",
+         "phone": f"{i // 10000:03d}-{i // 100 % 100:03d}-{i % 10000:04d}", "username": f"user{i}"}
+        for i in range(customer_count)
+    ]
+    orders = [
+        {"id": f"O{i:08d}", "customer_id": f"C{rng.randrange(customer_count):08d}",
+         "product": rng.choice(PRODUCTS), "quantity": rng.randint(1, 3),
+         "price": round(rng.uniform(5, 200), 2), "status": rng.choice(STATUSES)}
+        for i in range(order_count)
+    ]
+    return customers, orders
+
+
+# The lookups as they were before the indexes.
+def scan_get_user(db, key, value):
+    for customer in db.customers:
+        if customer[key] == value:
+            return customer
+    return None
+
+
+def scan_get_order_by_id(db, order_id):
+    for order in db.orders:
+        if order["id"] == order_id:
+            return order
+    return None
+
+
+def scan_get_customer_orders(db, customer_id):
+    return [order for order in db.orders if order["customer_id"] == customer_id]
+
+
+def per_call_us(fn, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e6
+
+
+def bench(size, calls, scan_calls, sqlite_dir=None, seed=11):
+    customers, orders = generate_catalog(size, size)
+    if sqlite_dir is not None:
+        # Loaded first: the in-memory cancel_order runs below change the same dicts.
+        path = os.path.join(sqlite_dir, f"chaldal-{size}.db")
+        repo = SqliteOrderRepository(path)
+        started = time.perf_counter()
+        repo.load(customers, orders)
+        load = time.perf_counter() - started
+    started = time.perf_counter()
+    db = FakeDatabase(customers, orders)
+    build = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    some_customers = [rng.choice(customers) for _ in range(calls)]
+    some_orders = [rng.choice(orders) for _ in range(calls)]
+    user_args = [(key, c[key]) for c, key in zip(some_customers, (USER_KEYS * calls)[:calls])]
+    order_args = [(o["id"],) for o in some_orders]
+    customer_args = [(c["id"],) for c in some_customers]
+
+    # Every index must agree with the scan it replaces.
+    for key, value in user_args[:scan_calls]:
+        assert db.get_user(key, value) is scan_get_user(db, key, value)
+    for (order_id,) in order_args[:scan_calls]:
+        assert db.get_order_by_id(order_id) is scan_get_order_by_id(db, order_id)
+    for (customer_id,) in customer_args[:scan_calls]:
+        assert db.get_customer_orders(customer_id) == scan_get_customer_orders(db, customer_id)
+
+    rows = [
+        ("get_user", per_call_us(lambda k, v: scan_get_user(db, k, v), user_args[:scan_calls]),
+         per_call_us(db.get_user, user_args)),
+        ("get_order_by_id", per_call_us(lambda o: scan_get_order_by_id(db, o), order_args[:scan_calls]),
+         per_call_us(db.get_order_by_id, order_args)),
+        ("get_customer_orders", per_call_us(lambda c: scan_get_customer_orders(db, c), customer_args[:scan_calls]),
+         per_call_us(db.get_customer_orders, customer_args)),
+    ]
+    # cancel_order used to scan through get_order_by_id; now it is one index hit.
+    rows.append(("cancel_order", rows[1][1], per_call_us(db.cancel_order, order_args)))
+
+    print(f"{size:>9,} customers / orders   index build {build:.2f}s")
+    for name, scan_us, index_us in rows:
+        print(f"    {name:<20} scan {scan_us:12.1f} us   index {index_us:6.2f} us   {scan_us / index_us:10.0f}x")
+
+    if sqlite_dir is not None:
+        calls = min(calls, 20000)
+        print(f"    sqlite load {load:.2f}s")
+        for name, fn, args_list in (("get_user", repo.get_user, user_args[:calls]),
+                                    ("get_order_by_id", repo.get_order_by_id, order_args[:calls]),
+                                    ("get_customer_orders", repo.get_customer_orders, customer_args[:calls])):
+            print(f"    {name:<20} sqlite {per_call_us(fn, args_list):8.1f} us")
+        repo.close()
+        cancel_race(path, [o["id"] for o in some_orders[:2000]])
+
+
+def cancel_orders(path, order_ids):
+    repo = SqliteOrderRepository(path)
+    try:
+        return sum(repo.cancel_order(order_id) == CANCELLED for order_id in order_ids)
+    finally:
+        repo.close()
+
+
+def cancel_race(path, order_ids, workers=4):
+    """Several processes cancel the same orders; each Processing order must be cancelled once."""
+    repo = SqliteOrderRepository(path)
+    order_ids = list(dict.fromkeys(order_ids))
+    processing = sum(repo.get_order_by_id(order_id)["status"] == "Processing" for order_id in order_ids)
+    repo.close()
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        cancelled = pool.starmap(cancel_orders, [(path, order_ids)] * workers)
+    elapsed = time.perf_counter() - started
+    status = "ok" if sum(cancelled) == processing else "FAIL"
+    print(f"    cancel race: {workers} processes x {len(order_ids)} orders in {elapsed:.2f}s, "
+          f"{sum(cancelled)} cancelled of {processing} processing ({'/'.join(map(str, cancelled))})   {status}")
+    return status == "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FakeDatabase lookups as the catalog grows")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--calls", type=int, default=100000, help="Indexed calls per lookup")
+    parser.add_argument("--scan-calls", type=int, default=20, help="Scanning calls per lookup")
+    parser.add_argument("--sqlite", action="store_true", help="Also benchmark SqliteOrderRepository")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sqlite_dir:
+        for size in args.sizes:
+            bench(size, args.calls, args.scan_calls, sqlite_dir if args.sqlite else None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Per-call tool dispatch overhead in the Chaldal support bot: the old path
+(json.loads, then validating into the params model, then passing the raw dict
+to process_tool_call) against run_tool_call (model_validate_json straight
+into the model, typed object to the handler).
+
+Usage:
+    python bench_chaldal_dispatch.py --calls 200000
+
+The repository is a stub that returns at once, so the numbers are the
+dispatch cost alone. The schema row shows what building each tool's JSON
+schema would cost if it were done per request instead of once at import.
+
+The replay rows run conversation-shaped call sequences (the same lookups
+repeated, a cancel, lookups again) with and without a ToolResultCache and
+report the hit rate: once on a local SQLite file, where a lookup is a few
+microseconds, and once with --store-latency-ms added to every repository
+call, like a database across the network.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from chaldal_repository import OrderRepository, SqliteOrderRepository
+from custom_support_chaldal import FakeDatabase, call_tool, params_model_map, run_tool_call
+from tool_cache import ToolResultCache
+
+CALLS = [
+    ("get_user", json.dumps({"key": "email", "value": "john@gmail.com"})),
+    ("get_order_by_id", json.dumps({"order_id": "24601"})),
+    ("get_customer_orders", json.dumps({"customer_id": "1213210"})),
+    ("cancel_order", json.dumps({"order_id": "13579"})),
+]
+BAD_CALLS = [
+    ("get_user", json.dumps({"key": "email"})),
+    ("get_order_by_id", '{"order_id": '),
+]
+
+
+class NullRepository(OrderRepository):
+    def get_user(self, key, value):
+        return None
+
+    def get_order_by_id(self, order_id):
+        return None
+
+    def get_customer_orders(self, customer_id):
+        return []
+
+    def cancel_order(self, order_id):
+        return None
+
+
+def legacy_process_tool_call(repo, tool_name, tool_input):
+    if tool_name == "get_user":
+        return repo.get_user(tool_input["key"], tool_input["value"])
+    elif tool_name == "get_order_by_id":
+        return repo.get_order_by_id(tool_input["order_id"])
+    elif tool_name == "get_customer_orders":
+        return repo.get_customer_orders(tool_input["customer_id"])
+    elif tool_name == "cancel_order":
+        return repo.cancel_order(tool_input["order_id"])
+    return "Unknown tool!"
+
+
+def legacy_dispatch(function_name, arguments, repo):
+    # simple_chat()'s old loop body, minus the printing.
+    try:
+        function_args = json.loads(arguments)
+    except Exception as e:
+        return f"Error parsing tool arguments: {e}"
+    try:
+        if function_name in params_model_map:
+            params = params_model_map[function_name](**function_args)  # noqa: F841 (validated, then dropped)
+            return legacy_process_tool_call(repo, function_name, function_args)
+        return f"Unknown tool: {function_name}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def per_call_us(fn, calls, repo, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for name, arguments in calls:
+            fn(name, arguments, repo)
+    return (time.perf_counter() - started) / (rounds * len(calls)) * 1e6
+
+
+class SlowRepository(OrderRepository):
+    def __init__(self, repo, latency):
+        self.repo = repo
+        self.latency = latency
+
+    def get_user(self, key, value):
+        time.sleep(self.latency)
+        return self.repo.get_user(key, value)
+
+    def get_order_by_id(self, order_id):
+        time.sleep(self.latency)
+        return self.repo.get_order_by_id(order_id)
+
+    def get_customer_orders(self, customer_id):
+        time.sleep(self.latency)
+        return self.repo.get_customer_orders(customer_id)
+
+    def cancel_order(self, order_id):
+        time.sleep(self.latency)
+        return self.repo.cancel_order(order_id)
+
+
+def conversation_calls(customer, order_id):
+    """What the model tends to do in one support chat: look things up again and again."""
+    user = ("get_user", json.dumps({"key": "email", "value": customer["email"]}))
+    orders = ("get_customer_orders", json.dumps({"customer_id": customer["id"]}))
+    cancel = ("cancel_order", json.dumps({"order_id": order_id}))
+    return [user, orders, user, orders, orders, cancel, orders, user]
+
+
+def replay(repo, cache, conversations, sample):
+    first_order = {}
+    for order in sample.orders:
+        first_order.setdefault(order["customer_id"], order["id"])
+    customers = [customer for customer in sample.customers if customer["id"] in first_order]
+    calls = [
+        conversation_calls(customer, first_order[customer["id"]])
+        for customer in (customers[i % len(customers)] for i in range(conversations))
+    ]
+    started = time.perf_counter()
+    count = 0
+    for conversation in calls:
+        for name, arguments in conversation:
+            # An explicit repo is only cached when a cache is passed in too.
+            call_tool(name, params_model_map[name].model_validate_json(arguments), repo, cache)
+            count += 1
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call tool dispatch overhead")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--store-latency-ms", type=float, default=1.0, help="Per-call latency for the remote-store replay")
+    args = parser.parse_args()
+
+    repo = NullRepository()
+    rounds = max(1, args.calls // len(CALLS))
+    for label, calls in (("valid arguments", CALLS), ("invalid arguments", BAD_CALLS)):
+        legacy_us = per_call_us(legacy_dispatch, calls, repo, rounds)
+        typed_us = per_call_us(run_tool_call, calls, repo, rounds)
+        print(f"{label:<18} json.loads + Model(**args) {legacy_us:6.2f} us   "
+              f"model_validate_json {typed_us:6.2f} us   {legacy_us / typed_us:5.2f}x")
+
+    schema_rounds = max(1, rounds // 100)
+    started = time.perf_counter()
+    for _ in range(schema_rounds):
+        for model in params_model_map.values():
+            model.model_json_schema()
+    schema_us = (time.perf_counter() - started) / (schema_rounds * len(params_model_map)) * 1e6
+    print(f"{'schema per request':<18} model_json_schema() {schema_us:6.1f} us per tool, "
+          f"{schema_us * len(params_model_map):.1f} us per request for all {len(params_model_map)} tools")
+
+    sample = FakeDatabase()
+    with tempfile.TemporaryDirectory() as directory:
+        repo = SqliteOrderRepository(os.path.join(directory, "chaldal.db"))
+        repo.load(sample.customers, sample.orders)
+        slow = SlowRepository(repo, args.store_latency_ms / 1000)
+        for label, store, conversations in (("replay, local", repo, max(1, args.calls // 80)),
+                                            (f"replay, {args.store_latency_ms:g} ms", slow, 100)):
+            plain_us = replay(store, None, conversations, sample)
+            cache = ToolResultCache()
+            cached_us = replay(store, cache, conversations, sample)
+            stats = cache.stats()
+            per_tool = ", ".join(f"{name} {tool['hit_rate']:.0%}" for name, tool in stats["tools"].items())
+            print(f"{label:<18} uncached {plain_us:8.1f} us per call   cached {cached_us:8.1f} us per call   "
+                  f"hit rate {stats['hit_rate']:.0%} ({per_tool})")
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
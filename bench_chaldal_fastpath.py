@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Replays recorded support turns through chat_turn_async() with and without
+fast replies, and reports the model round trips and latency the fast path
+saves.
+
+Usage:
+    python bench_chaldal_fastpath.py --model-latency 0.6
+
+A scripted client stands in for the model: each turn replays the tool calls
+and final answer the model gave in the transcript, after --model-latency
+seconds per call. The tools run for real, on a fresh FakeDatabase per run.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+
+from custom_support_chaldal import SYSTEM_MESSAGE, FakeDatabase, chat_turn_async
+
+
+def call(name, **arguments):
+    return {"tool": name, "arguments": arguments}
+
+
+def say(text):
+    return {"text": text}
+
+
+# One customer turn each: what they wrote, then what the model did, call by call.
+TRANSCRIPTS = [
+    ("order status", "Where is my order 24601?",
+     [call("get_order_by_id", order_id="24601"),
+      say("Your order 24601 (1 x Wireless Headphones) has shipped and is on its way.")]),
+    ("cancel, processing", "Please cancel order 13579.",
+     [call("cancel_order", order_id="13579"),
+      say("I've cancelled order 13579 for you.")]),
+    ("cancel, shipped", "Can you cancel order 97531?",
+     [call("cancel_order", order_id="97531"),
+      say("I'm sorry, order 97531 has already shipped, so it can't be cancelled.")]),
+    ("unknown order", "What's happening with order 11111?",
+     [call("get_order_by_id", order_id="11111"),
+      say("I couldn't find an order with that number. Could you check it?")]),
+    ("unknown customer", "I'm someone@nowhere.com, where are my orders?",
+     [call("get_user", key="email", value="someone@nowhere.com"),
+      say("I couldn't find an account with that email address.")]),
+    ("orders by email", "I'm priya@candy.com, what have I ordered?",
+     [call("get_user", key="email", value="priya@candy.com"),
+      call("get_customer_orders", customer_id="2837622"),
+      say("You have two orders: a Bluetooth Speaker (shipped) and two Wireless Headphones (processing).")]),
+    ("cancel by email", "This is hiroshi@gmail.com, please cancel my mouse order.",
+     [call("get_user", key="email", value="hiroshi@gmail.com"),
+      call("get_customer_orders", customer_id="5190753"),
+      call("cancel_order", order_id="19283"),
+      say("Done, your Wireless Mouse order 19283 is cancelled.")]),
+    ("small talk", "Hi, are you a bot?",
+     [say("I'm TechNova's support assistant. How can I help with your orders today?")]),
+]
+
+
+class ScriptedClient:
+    def __init__(self, steps, latency):
+        self.steps = list(steps)
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        await asyncio.sleep(self.latency)
+        step = self.steps.pop(0)
+        message = {"role": "assistant", "content": step.get("text")}
+        if "tool" in step:
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": step["tool"], "arguments": json.dumps(step["arguments"])},
+            }]
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-replay",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if "tool" in step else "stop"}],
+        })
+
+
+async def replay(fast_replies, latency):
+    repo = FakeDatabase()
+    tool_slots = asyncio.Semaphore(8)
+
+    async def turn(user_text, steps):
+        counters = {}
+        messages = [{"role": "system", "content": SYSTEM_MESSAGE}, {"role": "user", "content": user_text}]
+        started = time.perf_counter()
+        reply = await chat_turn_async(ScriptedClient(steps, latency), messages, tool_slots, repo,
+                                      fast_replies, counters)
+        return counters["model_calls"], time.perf_counter() - started, reply
+
+    # Turns are independent, so they replay side by side.
+    return await asyncio.gather(*(turn(user_text, steps) for _, user_text, steps in TRANSCRIPTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round trips and latency saved by fast replies")
+    parser.add_argument("--model-latency", type=float, default=0.6, help="Seconds per scripted model call")
+    parser.add_argument("--show-replies", action="store_true", help="Print the fast path's replies")
+    args = parser.parse_args()
+
+    slow = asyncio.run(replay(False, args.model_latency))
+    fast = asyncio.run(replay(True, args.model_latency))
+
+    print(f"{'turn':<20} {'model calls':>12} {'latency (s)':>14}")
+    for (name, _, _), (slow_calls, slow_s, _), (fast_calls, fast_s, reply) in zip(TRANSCRIPTS, slow, fast):
+        print(f"{name:<20} {slow_calls:>5} -> {fast_calls:<4} {slow_s:6.2f} -> {fast_s:<6.2f}")
+        if args.show_replies:
+            print(f"{'':<20} {reply}")
+    slow_calls, fast_calls = sum(r[0] for r in slow), sum(r[0] for r in fast)
+    slow_s, fast_s = sum(r[1] for r in slow), sum(r[1] for r in fast)
+    short = sum(1 for s, f in zip(slow, fast) if f[0] < s[0])
+    print(f"\n{len(TRANSCRIPTS)} turns, {short} answered by the fast path: "
+          f"{slow_calls} -> {fast_calls} model calls ({slow_calls - fast_calls} saved), "
+          f"{slow_s:.2f}s -> {fast_s:.2f}s of turn latency ({1 - fast_s / slow_s:.0%} less)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Streaming output benchmark for oa-cli.py: the old print-and-flush per token
+against oa_render.StreamRenderer, on a generated 4k-token markdown answer.
+
+Usage:
+    python bench_render.py --tokens 4000 --token-delay 0.002
+
+Output goes to /dev/null through a wrapper that counts writes and flushes.
+CPU time is process time; the "stream only" row is the cost of the simulated
+stream itself (sleeping between deltas is not free), for comparison.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from oa_render import StreamRenderer
+
+WORDS = "the model streams tokens to the terminal while the reader keeps up with every line".split()
+
+
+class CountingSink:
+    def __init__(self, target):
+        self.target = target
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return self.target.write(text)
+
+    def flush(self):
+        self.flushes += 1
+        self.target.flush()
+
+    def isatty(self):
+        return False
+
+
+def make_tokens(count, seed=3):
+    """Deltas shaped like a markdown answer: headings, lists, code blocks."""
+    rng = random.Random(seed)
+    tokens = []
+    while len(tokens) < count:
+        kind = rng.random()
+        if kind < 0.1:
+            tokens += ["## ", "Section", " ", str(len(tokens)), "\n\n"]
+        elif kind < 0.2:
+            tokens += ["```python\n", "for", " item", " in", " items", ":\n", "    print", "(item)", "\n```\n\n"]
+        elif kind < 0.4:
+            for _ in range(rng.randint(2, 5)):
+                tokens += ["- "] + [" " + rng.choice(WORDS) for _ in range(rng.randint(3, 9))] + ["\n"]
+            tokens.append("\n")
+        else:
+            tokens += [" " + rng.choice(WORDS) for _ in range(rng.randint(20, 60))] + [".", "\n\n"]
+    return tokens[:count]
+
+
+def stream(tokens, delay):
+    for token in tokens:
+        if delay:
+            time.sleep(delay)
+        yield token
+
+
+def bare(tokens, delay, sink):
+    # The stream alone, to subtract from the others.
+    return "".join(stream(tokens, delay))
+
+
+def legacy(tokens, delay, sink):
+    full_response = ""
+    for content in stream(tokens, delay):
+        print(content, end="", flush=True, file=sink)
+        full_response += content
+    return full_response
+
+
+def rendered(tokens, delay, sink, markdown):
+    renderer = StreamRenderer(out=sink, markdown=markdown)
+    try:
+        for content in stream(tokens, delay):
+            renderer.write(content)
+    finally:
+        text = renderer.close()
+    return text
+
+
+def run(name, fn, tokens):
+    with open(os.devnull, "w") as devnull:
+        sink = CountingSink(devnull)
+        cpu, wall = time.process_time(), time.perf_counter()
+        text = fn(sink)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    assert text == "".join(tokens)
+    print(f"{name:<18} cpu {cpu * 1000:8.1f} ms   wall {wall:6.2f}s   writes {sink.writes:>6}   flushes {sink.flushes:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streamed output rendering")
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Seconds between deltas, like a live stream")
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.tokens)
+    print(f"{len(tokens)} deltas, {len(''.join(tokens))} characters, {args.token_delay * 1000:.1f} ms apart")
+    run("stream only", lambda sink: bare(tokens, args.token_delay, sink), tokens)
+    run("print + flush", lambda sink: legacy(tokens, args.token_delay, sink), tokens)
+    run("StreamRenderer", lambda sink: rendered(tokens, args.token_delay, sink, False), tokens)
+    try:
+        import rich  # noqa: F401
+    except ImportError:
+        print("markdown           skipped (pip install rich)")
+    else:
+        run("markdown", lambda sink: rendered(tokens, args.token_delay, sink, True), tokens)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Throughput of sentiment.py's batch API against the old one-at-a-time loop,
+on model_stub.py with a rate limit.
+
+Usage:
+    python bench_sentiment_batch.py --messages 2000 --concurrency 64 --latency 0.25 --rate-limit 150
+
+The serial loop is timed on --serial-sample messages and projected, since it
+would take --messages x latency seconds. The batch run reports how many
+requests were rate limited and retried; every message should still get a
+result.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from loadtest_bank import spawn, wait_for_port
+
+STUB_PORT = 8794
+OPENERS = ["My order", "The delivery", "Your support team", "The app", "This week's groceries"]
+VERDICTS = ["arrived late again", "was perfect, thank you", "is fine I guess", "charged me twice",
+            "made my day", "still hasn't been refunded"]
+
+
+def make_messages(count, seed=5):
+    rng = random.Random(seed)
+    return [f"{rng.choice(OPENERS)} {rng.choice(VERDICTS)} (ticket {i})" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentiment.py batch scoring")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.25, help="Stubbed model latency in seconds")
+    parser.add_argument("--rate-limit", type=float, default=150, help="Stub's requests per second before 429s")
+    parser.add_argument("--serial-sample", type=int, default=20, help="Messages to time the serial loop on")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    # sentiment.py builds its client at import, so it comes after the environment.
+    import sentiment
+
+    messages = make_messages(args.messages)
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency),
+                  "--rate-limit", str(args.rate_limit)], dict(os.environ))
+    try:
+        wait_for_port(STUB_PORT)
+        started = time.perf_counter()
+        for message in messages[:args.serial_sample]:
+            response = sentiment.client.chat.completions.create(**sentiment.sentiment_request(message))
+            sentiment.extract_function_result(response, "print_sentiment_scores")
+        serial_rate = args.serial_sample / (time.perf_counter() - started)
+
+        backoff = sentiment.Backoff()
+        started = time.perf_counter()
+        results = asyncio.run(sentiment.analyze_sentiment_batch(
+            messages, concurrency=args.concurrency, backoff=backoff))
+        elapsed = time.perf_counter() - started
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    ok = sum(1 for result in results if result.error is None)
+    in_order = [result.input for result in results] == messages
+    batch_rate = len(results) / elapsed
+    print(f"{args.messages} messages, model latency {args.latency}s, stub limit {args.rate_limit:g} requests/s\n")
+    print(f"serial loop   {serial_rate:8.1f} messages/s   {serial_rate * 3600:10,.0f} per hour")
+    print(f"batch ({args.concurrency:>3})   {batch_rate:8.1f} messages/s   {batch_rate * 3600:10,.0f} per hour   "
+          f"{ok}/{len(results)} ok, {backoff.rate_limited} rate limited, {backoff.retries} retries, "
+          f"max {max(result.attempts for result in results)} attempts, in order: {in_order}")
+    return 0 if ok == len(results) and in_order else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Calls, prompt tokens and latency per customer message for sentiment.py's
+three separate analyses (sentiment, entities, translation) against the
+combined print_message_analysis call, on model_stub.py.
+
+Usage:
+    python bench_sentiment_combined.py --messages 30 --latency 0.25
+
+Prompt tokens are the stub's estimate (about four characters a token over
+the messages and tool schemas), so compare the ratio rather than the
+absolute numbers. The partial row drops each section from a combined result
+in turn and checks the other two still come through.
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_sentiment_batch import STUB_PORT, make_messages
+from loadtest_bank import spawn, wait_for_port
+
+SEPARATE = [
+    ("sentiment_request", "print_sentiment_scores"),
+    ("entities_request", "print_entities"),
+    ("translation_request", "translate_text"),
+]
+
+
+def run(sentiment, messages, requests):
+    calls = prompt_tokens = 0
+    started = time.perf_counter()
+    for message in messages:
+        for build, function_name in requests:
+            response = sentiment.client.chat.completions.create(**getattr(sentiment, build)(message))
+            sentiment.extract_function_result(response, function_name)
+            calls += 1
+            prompt_tokens += response.usage.prompt_tokens
+    return calls, prompt_tokens, (time.perf_counter() - started) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Separate vs combined sentiment.py analyses")
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.25, help="Stubbed model latency in seconds")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    # sentiment.py builds its client at import, so it comes after the environment.
+    import sentiment
+
+    messages = make_messages(args.messages)
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency)], dict(os.environ))
+    try:
+        wait_for_port(STUB_PORT)
+        separate = run(sentiment, messages, SEPARATE)
+        combined = run(sentiment, messages, [("analysis_request", "print_message_analysis")])
+        response = sentiment.client.chat.completions.create(**sentiment.analysis_request(messages[0]))
+        full = sentiment.extract_function_result(response, "print_message_analysis")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{args.messages} messages, model latency {args.latency}s\n")
+    print(f"{'':<10} {'calls':>6} {'prompt tokens':>14} {'latency/message':>16}")
+    for label, (calls, tokens, latency) in (("separate", separate), ("combined", combined)):
+        print(f"{label:<10} {calls:>6} {tokens:>14} {latency * 1000:>13.0f} ms")
+    print(f"\ncombined: {separate[0] / combined[0]:.1f}x fewer calls, "
+          f"{separate[1] / combined[1]:.1f}x fewer prompt tokens, {separate[2] / combined[2]:.1f}x lower latency")
+
+    parsed = sentiment.split_analysis(full)
+    ok = all(value is not None for value in parsed.values())
+    for key in ("sentiment", "entities", "translated_text"):
+        partial = sentiment.split_analysis({k: v for k, v in full.items() if k != key})
+        ok = ok and sum(value is None for value in partial.values()) == 1
+    print(f"partial   every section parsed, and each missing section left the other two intact: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Documents per second and tokens per document for sentiment.py's packed
+scoring (analyze_sentiment_packed, many documents per call) against one
+document per call (analyze_sentiment_batch), on model_stub.py.
+
+Usage:
+    python bench_sentiment_packed.py --messages 2000 --pack-size 20 --bad-items 0.05
+
+The stub takes --latency per call plus --output-token-latency per generated
+token, so a packed call is slower than a single one, as it would be from the
+model. --bad-items makes the stub leave out or garble that share of the
+per-document entries, which the packed path has to notice and score again
+one by one. Token counts are the stub's estimate (about four characters a
+token), measured on --token-sample documents.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from bench_sentiment_batch import STUB_PORT, make_messages
+from loadtest_bank import spawn, wait_for_port
+
+
+def tokens_per_document(sentiment, messages, pack_size):
+    single = packed = 0
+    for message in messages:
+        usage = sentiment.client.chat.completions.create(**sentiment.sentiment_request(message)).usage
+        single += usage.total_tokens
+    for pack in sentiment.pack_documents(messages, pack_size, 8000):
+        request = sentiment.packed_sentiment_request([(str(index), text) for index, text in pack])
+        packed += sentiment.client.chat.completions.create(**request).usage.total_tokens
+    return single / len(messages), packed / len(messages)
+
+
+async def score(sentiment, messages, concurrency, pack_size):
+    backoff = sentiment.Backoff()
+    if pack_size:
+        results = await sentiment.analyze_sentiment_packed(
+            messages, pack_size=pack_size, concurrency=concurrency, backoff=backoff)
+    else:
+        results = await sentiment.analyze_sentiment_batch(messages, concurrency=concurrency, backoff=backoff)
+    return results, backoff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark packed sentiment scoring")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--pack-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.4, help="Stubbed model latency per call in seconds")
+    parser.add_argument("--output-token-latency", type=float, default=0.01, help="Stubbed seconds per generated token")
+    parser.add_argument("--bad-items", type=float, default=0.05, help="Share of packed entries the stub drops or garbles")
+    parser.add_argument("--token-sample", type=int, default=40)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    # sentiment.py builds its client at import, so it comes after the environment.
+    import sentiment
+
+    messages = make_messages(args.messages)
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency),
+                  "--output-token-latency", str(args.output_token_latency),
+                  "--bad-items", str(args.bad_items)], dict(os.environ))
+    rows = []
+    try:
+        wait_for_port(STUB_PORT)
+        single_tokens, packed_tokens = tokens_per_document(sentiment, messages[:args.token_sample], args.pack_size)
+        for label, pack_size, tokens in (("one per call", 0, single_tokens),
+                                         (f"packed ({args.pack_size})", args.pack_size, packed_tokens)):
+            started = time.perf_counter()
+            results, backoff = asyncio.run(score(sentiment, messages, args.concurrency, pack_size))
+            rows.append((label, results, backoff, time.perf_counter() - started, tokens))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{args.messages} messages, concurrency {args.concurrency}, latency {args.latency}s "
+          f"+ {args.output_token_latency}s/token, {args.bad_items:.0%} bad packed entries\n")
+    print(f"{'':<14} {'docs/s':>8} {'tokens/doc':>11} {'calls':>6} {'ok':>6} {'in order':>9}")
+    ok_all = True
+    for label, results, backoff, elapsed, tokens in rows:
+        ok = sum(1 for result in results if result.error is None)
+        in_order = [result.input for result in results] == messages
+        ok_all = ok_all and ok == len(messages) and in_order
+        print(f"{label:<14} {len(results) / elapsed:8.1f} {tokens:11.1f} {backoff.sent:6} {ok:6} {str(in_order):>9}")
+    (_, _, single, single_s, single_tokens), (_, _, packed, packed_s, packed_tokens) = rows
+    packs = -(-args.messages // args.pack_size)
+    print(f"\npacked: {single_s / packed_s:.1f}x documents/s, {single_tokens / packed_tokens:.1f}x fewer tokens "
+          f"per document, {packed.sent - packs} documents re-scored alone after a bad entry")
+    return 0 if ok_all else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for oa-cli.py, built on `python -X importtime`.
+
+Usage:
+    python bench_startup.py                 # --help, --list-sessions, --clear
+    python bench_startup.py --with-query    # also a one-shot query against model_stub.py
+
+For each command it reports the wall time and the time spent importing
+oa-cli's own dependencies (modules a bare `python -c pass` does not already
+import), takes the median of --runs, and lists the slowest imports. It exits
+non-zero when a command goes over --budget-ms of imports, or imports a module
+that command should not need. That makes it usable as a regression check.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest_bank import spawn, wait_for_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUB_PORT = 8792
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+# Modules each command must not import. The one-shot query may use openai,
+# but with a short history it never needs the tokenizer.
+LIGHT_FORBIDDEN = ("openai", "tiktoken", "readline", "httpx", "asyncio")
+QUERY_FORBIDDEN = ("tiktoken", "readline")
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative microseconds} and the set of all modules imported."""
+    top, seen = {}, set()
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        seen.add(name)
+        if len(indent) == 1:
+            top[name] = int(cumulative)
+    return top, seen
+
+
+def run(args, env):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=HERE, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {proc.returncode}:\n{proc.stderr[-2000:]}")
+    return elapsed, *parse_importtime(proc.stderr)
+
+
+def measure(name, args, env, baseline, runs, budget_ms, forbidden, show):
+    walls, totals, slowest = [], [], {}
+    for _ in range(runs):
+        wall, top, seen = run(args, env)
+        own = {module: us for module, us in top.items() if module not in baseline}
+        walls.append(wall)
+        totals.append(sum(own.values()))
+        for module, us in own.items():
+            slowest.setdefault(module, []).append(us)
+    wall_ms = statistics.median(walls) * 1000
+    import_ms = statistics.median(totals) / 1000
+    bad = sorted({module.split(".")[0] for module in seen} & set(forbidden))
+    over = budget_ms is not None and import_ms > budget_ms
+    status = "FAIL" if over or bad else "ok"
+    budget = f"/ {budget_ms:.0f} ms budget" if budget_ms is not None else ""
+    print(f"{name:<16} wall {wall_ms:7.1f} ms   imports {import_ms:7.1f} ms {budget:<16} {status}")
+    ranked = sorted(slowest.items(), key=lambda item: -statistics.median(item[1]))[:show]
+    for module, samples in ranked:
+        print(f"{'':<18}{statistics.median(samples) / 1000:7.1f} ms  {module}")
+    if bad:
+        print(f"{'':<18}should not import: {', '.join(bad)}")
+    return status == "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure oa-cli.py cold start with -X importtime")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command; the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=40.0,
+                        help="Most import time allowed for commands that do not call the API")
+    parser.add_argument("--with-query", action="store_true", help="Also time a one-shot query against model_stub.py")
+    parser.add_argument("--show", type=int, default=5, help="Slowest imports to list per command")
+    args = parser.parse_args()
+
+    _, _, baseline = run(["-c", "pass"], os.environ.copy())
+    ok = True
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, OPENAI_API_KEY="stub")
+        for name, command in (("--help", ["--help"]),
+                              ("--list-sessions", ["--list-sessions"]),
+                              ("--clear", ["--clear"])):
+            ok &= measure(name, ["oa-cli.py", *command], env, baseline, args.runs,
+                          args.budget_ms, LIGHT_FORBIDDEN, args.show)
+
+        if args.with_query:
+            env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+            stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", "0"], env)
+            try:
+                wait_for_port(STUB_PORT)
+                ok &= measure("query", ["oa-cli.py", "--no-stream", "hello"], env, baseline, args.runs,
+                              None, QUERY_FORBIDDEN, args.show)
+            finally:
+                stub.terminate()
+                stub.wait()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Token accounting benchmark for oa-cli.py: the old count-everything-per-pop
+pruning against TokenLedger, on a generated history file.
+
+Usage:
+    python bench_tokens.py --messages 10000
+
+Two measurements:
+- Pruning a history down to half its tokens, at a few sizes. The old loop
+  re-encodes the whole history after every pop, so it is only run up to
+  --legacy-max messages.
+- A --messages history journal loaded through oa-cli's load_history(), which
+  reads only the tail that fits the real 128k window, then one more turn.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import tiktoken
+
+from oa_journal import Journal
+from token_utils import TokenLedger
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORDS = ("account balance transfer python stream token window history model reply "
+         "context message prune cache encoder request session latency answer question").split()
+
+
+def load_oa_cli():
+    spec = importlib.util.spec_from_file_location("oa_cli", os.path.join(HERE, "oa-cli.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_history(count, seed=7):
+    rng = random.Random(seed)
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(count - 1):
+        role = "user" if i % 2 == 0 else "assistant"
+        length = rng.randint(5, 25) if role == "user" else rng.randint(20, 90)
+        messages.append({"role": role, "content": f"#{i} " + " ".join(rng.choice(WORDS) for _ in range(length))})
+    return messages
+
+
+# The accounting oa-cli.py used before TokenLedger, kept here as the baseline.
+def legacy_count_tokens(messages, model):
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    num_tokens = 0
+    for message in messages:
+        num_tokens += 4
+        for key, value in message.items():
+            num_tokens += len(encoding.encode(value))
+            if key == "name":
+                num_tokens -= 1
+    return num_tokens + 2
+
+
+def legacy_prune(messages, max_tokens, model):
+    token_count = legacy_count_tokens(messages, model)
+    if token_count <= max_tokens:
+        return messages
+    pruned = messages.copy()
+    while token_count > max_tokens and len(pruned) > 1:
+        oldest = next((i for i, msg in enumerate(pruned) if msg["role"] != "system"), 0)
+        pruned.pop(oldest)
+        token_count = legacy_count_tokens(pruned, model)
+    return pruned
+
+
+def counted_ledger(messages, model):
+    ledger = TokenLedger(messages, model)
+    ledger.total  # count every message now, so the timing includes it
+    return ledger
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark oa-cli token accounting")
+    parser.add_argument("--messages", type=int, default=10000, help="Messages in the generated history file")
+    parser.add_argument("--legacy-max", type=int, default=1000, help="Largest history to run the old pruning on")
+    args = parser.parse_args()
+
+    oa_cli = load_oa_cli()
+    model = oa_cli.MODEL
+
+    print("Prune to half the tokens:")
+    print(f"{'messages':>9} {'old':>10} {'ledger build':>13} {'ledger prune':>13} {'kept':>6}")
+    for size in sorted({250, 500, args.legacy_max, args.messages}):
+        history = make_history(size)
+        # Fresh dict copies so memoised text counts from one run don't help the next.
+        ledger, build = timed(lambda: counted_ledger([dict(m) for m in history], model))
+        target = ledger.total // 2
+        _, prune = timed(lambda: ledger.prune(target))
+        if size <= args.legacy_max:
+            kept, legacy = timed(lambda: legacy_prune(history, target, model))
+            assert len(kept) == len(ledger), (len(kept), len(ledger))
+            old = f"{legacy:9.3f}s"
+        else:
+            old = "skipped"
+        print(f"{size:>9} {old:>10} {build:12.3f}s {prune:12.4f}s {len(ledger):>6}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        oa_cli.HISTORY_FILE = Path(directory) / "history.json"
+        oa_cli.JOURNAL_FILE = Path(directory) / "history.jsonl"
+        oa_cli.SESSIONS_DIR = Path(directory) / "sessions"
+        Journal(oa_cli.JOURNAL_FILE).rewrite(make_history(args.messages)[1:])
+
+        messages, load = timed(oa_cli.load_history)
+        ledger, build = timed(lambda: counted_ledger(messages, model))
+        _, prune = timed(lambda: oa_cli.prune_messages_if_needed(ledger))
+        print(f"\n{args.messages}-message history journal, window {oa_cli.MAX_CONTEXT_TOKENS} tokens:")
+        print(f"  load tail {load:.3f}s ({len(messages)} messages), count {build:.3f}s, prune {prune * 1000:.2f} ms")
+
+        def next_turn():
+            ledger.append({"role": "user", "content": "One more question about my account balance."})
+            oa_cli.prune_messages_if_needed(ledger)
+            ledger.append({"role": "assistant", "content": "Here is the answer to your question."})
+            oa_cli.prune_messages_if_needed(ledger)
+
+        _, turn = timed(next_turn)
+        print(f"  next turn (two messages added and pruned): {turn * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
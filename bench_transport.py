@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Connection reuse benchmark: a fresh connection per request (what the scripts
+used to do) against the pooled clients from transport.py, over HTTPS to a local
+model_stub.py with a throwaway self-signed certificate.
+
+Usage:
+    python bench_transport.py --requests 200
+
+The stub answers with no added latency, so the gap between the two columns is
+mostly the TCP + TLS handshake that keep-alive saves.
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest_bank import percentile, spawn, wait_for_port
+
+PORT = 8791
+URL = f"https://127.0.0.1:{PORT}/v1/chat/completions"
+PAYLOAD = {"model": "gpt-4o", "messages": [{"role": "user", "content": "What is 245 + 367?"}]}
+
+
+def make_certificate(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+def timed(fn, total):
+    samples = []
+    for _ in range(total):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def timed_async(fn, total):
+    samples = []
+    for _ in range(total):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_requests(total):
+    import requests
+    import transport
+
+    session = transport.requests_session()
+    fresh = timed(lambda: requests.post(URL, json=PAYLOAD).raise_for_status(), total)
+    pooled = timed(lambda: session.post(URL, json=PAYLOAD).raise_for_status(), total)
+    return fresh, pooled
+
+
+def bench_openai(total):
+    from openai import OpenAI
+    import transport
+
+    def fresh_client():
+        # What oa-cli.py did: a new client, and so a new pool, per call.
+        with OpenAI() as client:
+            client.chat.completions.create(**PAYLOAD)
+
+    client = transport.openai_client()
+    fresh = timed(fresh_client, total)
+    pooled = timed(lambda: client.chat.completions.create(**PAYLOAD), total)
+    return fresh, pooled
+
+
+async def bench_aiohttp(total, cert):
+    import aiohttp
+    import transport
+
+    # aiohttp builds its default SSL context at import, before SSL_CERT_FILE is set.
+    context = ssl.create_default_context(cafile=cert)
+
+    async def fresh_session():
+        # What deep-research.py did: a new ClientSession per page read.
+        async with aiohttp.ClientSession() as session:
+            async with session.post(URL, json=PAYLOAD, ssl=context) as resp:
+                await resp.read()
+
+    async def shared_session():
+        async with transport.aiohttp_session().post(URL, json=PAYLOAD, ssl=context) as resp:
+            await resp.read()
+
+    try:
+        return await timed_async(fresh_session, total), await timed_async(shared_session, total)
+    finally:
+        await transport.close_aiohttp_session()
+
+
+def report(name, fresh, pooled):
+    fresh_mean = sum(fresh) / len(fresh) * 1000
+    pooled_mean = sum(pooled) / len(pooled) * 1000
+    print(f"{name:<10} fresh {fresh_mean:7.2f} ms (p99 {percentile(fresh, 99) * 1000:7.2f})   "
+          f"pooled {pooled_mean:7.2f} ms (p99 {percentile(pooled, 99) * 1000:7.2f})   "
+          f"saved {fresh_mean - pooled_mean:6.2f} ms/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure what connection pooling saves per request")
+    parser.add_argument("--requests", type=int, default=200, help="Sequential requests per client")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        # Trust the throwaway certificate in requests and httpx.
+        os.environ["REQUESTS_CA_BUNDLE"] = cert
+        os.environ["SSL_CERT_FILE"] = cert
+        os.environ["OPENAI_BASE_URL"] = f"https://127.0.0.1:{PORT}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+        stub = spawn(["model_stub.py", "--port", str(PORT), "--latency", "0",
+                      "--certfile", cert, "--keyfile", key], os.environ.copy())
+        try:
+            wait_for_port(PORT)
+            import transport
+            # The stub only speaks HTTP/1.1, so HTTP/2 is offered but not used here.
+            print(f"{args.requests} sequential requests each; "
+                  f"h2 {'installed' if transport.http2_available() else 'not installed'}")
+            report("requests", *bench_requests(args.requests))
+            report("openai", *bench_openai(args.requests))
+            report("aiohttp", *asyncio.run(bench_aiohttp(args.requests, cert)))
+        finally:
+            stub.terminate()
+            stub.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Order and customer storage for the Chaldal support bot.
+
+OrderRepository is the interface process_tool_call() works against.
+FakeDatabase (custom_support_chaldal.py) implements it in memory, and
+SqliteOrderRepository keeps the data in an SQLite file, so it survives
+restarts and several bot processes can share it.
+
+The SQLite file runs in WAL mode, so readers never wait on a writer, and each
+thread gets its own connection. Every query is a fixed SQL string with
+parameters; sqlite3 keeps the prepared statement for each one on the
+connection and reuses it. cancel_order is one conditional UPDATE, so two
+workers cancelling the same order cannot both succeed.
+"""
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+USER_KEYS = ("email", "phone", "username")
+
+CANCELLED = "Cancelled the order"
+NOT_CANCELLABLE = "Order has already shipped. Can't cancel it."
+ORDER_NOT_FOUND = "Can't find that order!"
+
+
+def user_not_found(key, value):
+    return f"Couldn't find a user with {key} of {value}"
+
+
+class OrderRepository(ABC):
+    """What the support bot's tools need from a store of customers and orders."""
+
+    @abstractmethod
+    def get_user(self, key, value):
+        """The customer whose `key` (email, phone or username) is `value`, or a not-found message."""
+
+    @abstractmethod
+    def get_order_by_id(self, order_id):
+        """The order, or None."""
+
+    @abstractmethod
+    def get_customer_orders(self, customer_id):
+        """The customer's orders, oldest first."""
+
+    @abstractmethod
+    def cancel_order(self, order_id):
+        """Cancel the order if it is still Processing; returns a message for the model."""
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS customers ("
+    "id TEXT PRIMARY KEY, name TEXT, email TEXT, phone TEXT, username TEXT)",
+    "CREATE INDEX IF NOT EXISTS customers_email ON customers (email)",
+    "CREATE INDEX IF NOT EXISTS customers_phone ON customers (phone)",
+    "CREATE INDEX IF NOT EXISTS customers_username ON customers (username)",
+    "CREATE TABLE IF NOT EXISTS orders ("
+    "id TEXT PRIMARY KEY, customer_id TEXT NOT NULL, product TEXT, quantity INTEGER, price REAL, "
+    "status TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_id)",
+)
+
+# Column names come from USER_KEYS only, never from the caller.
+GET_USER = {
+    key: f"SELECT id, name, email, phone, username FROM customers WHERE {key} = ? ORDER BY rowid LIMIT 1"
+    for key in USER_KEYS
+}
+GET_ORDER = "SELECT id, customer_id, product, quantity, price, status FROM orders WHERE id = ?"
+GET_CUSTOMER_ORDERS = (
+    "SELECT id, customer_id, product, quantity, price, status FROM orders WHERE customer_id = ? ORDER BY rowid"
+)
+CANCEL_ORDER = "UPDATE orders SET status = 'Cancelled' WHERE id = ? AND status = 'Processing'"
+ORDER_EXISTS = "SELECT 1 FROM orders WHERE id = ?"
+INSERT_CUSTOMER = (
+    "INSERT OR IGNORE INTO customers (id, name, email, phone, username) "
+    "VALUES (:id, :name, :email, :phone, :username)"
+)
+INSERT_ORDER = (
+    "INSERT OR IGNORE INTO orders (id, customer_id, product, quantity, price, status) "
+    "VALUES (:id, :customer_id, :product, :quantity, :price, :status)"
+)
+
+
+class SqliteOrderRepository(OrderRepository):
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        db = self._db()
+        for statement in SCHEMA:
+            db.execute(statement)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit: each statement is its own transaction unless load() opens one.
+            # Only this thread uses the connection, but close() may run on another, so
+            # sqlite3's same-thread check is off.
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                 check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def close(self):
+        with self._lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def load(self, customers, orders):
+        """Insert customers and orders in one transaction; rows whose id exists are kept as they are."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(INSERT_CUSTOMER, customers)
+            db.executemany(INSERT_ORDER, orders)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def is_empty(self):
+        return self._db().execute("SELECT 1 FROM customers LIMIT 1").fetchone() is None
+
+    def get_user(self, key, value):
+        if key not in GET_USER:
+            raise ValueError(f"Invalid key: {key}")
+        row = self._db().execute(GET_USER[key], (value,)).fetchone()
+        if row is None:
+            return user_not_found(key, value)
+        return dict(row)
+
+    def get_order_by_id(self, order_id):
+        row = self._db().execute(GET_ORDER, (order_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_customer_orders(self, customer_id):
+        return [dict(row) for row in self._db().execute(GET_CUSTOMER_ORDERS, (customer_id,))]
+
+    def cancel_order(self, order_id):
+        db = self._db()
+        if db.execute(CANCEL_ORDER, (order_id,)).rowcount == 1:
+            return CANCELLED
+        # Nothing changed: either there is no such order or it is past Processing.
+        if db.execute(ORDER_EXISTS, (order_id,)).fetchone() is None:
+            return ORDER_NOT_FOUND
+        return NOT_CANCELLABLE
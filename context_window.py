@@ -0,0 +1,71 @@
+"""
+Token-budgeted history windowing.
+
+ContextWindow.fit() picks the part of a conversation to send to the model:
+the leading system prompt, then as many of the most recent turns as fit in the
+budget. A turn is a user message plus everything up to the next one, so an
+assistant tool call is always kept or dropped together with its results.
+Older turns are dropped, or condensed by an optional `summarize` callback.
+"""
+from collections import namedtuple
+
+from token_utils import DEFAULT_MODEL, count_message_tokens
+
+Window = namedtuple("Window", ["messages", "prompt_tokens", "dropped"])
+
+
+def role_of(message):
+    return message.get("role") if isinstance(message, dict) else message.role
+
+
+def group_turns(messages):
+    """Split messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if role_of(message) == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+class ContextWindow:
+    def __init__(self, budget_tokens=4000, model=DEFAULT_MODEL, summarize=None):
+        self.budget_tokens = budget_tokens
+        self.model = model
+        # summarize(dropped_messages) -> str, used in place of the dropped turns
+        self.summarize = summarize
+
+    def fit(self, messages, extra_tokens=0):
+        """
+        Return a Window for `messages`. `extra_tokens` covers the other parts of
+        the request that count against the budget, such as tool schemas.
+        """
+        system = []
+        for message in messages:
+            if role_of(message) != "system":
+                break
+            system.append(message)
+        units = group_turns(messages[len(system):])
+
+        used = extra_tokens + 2 + sum(count_message_tokens(m, self.model) for m in system)
+        kept = []
+        # Newest first; the latest turn is always sent even if it is over budget.
+        for i in range(len(units) - 1, -1, -1):
+            cost = sum(count_message_tokens(m, self.model) for m in units[i])
+            if kept and used + cost > self.budget_tokens:
+                break
+            kept.append(units[i])
+            used += cost
+        kept.reverse()
+
+        dropped = [m for unit in units[:len(units) - len(kept)] for m in unit]
+        if dropped and self.summarize is not None:
+            summary = {"role": "system", "content": f"Summary of the earlier conversation: {self.summarize(dropped)}"}
+            cost = count_message_tokens(summary, self.model)
+            if used + cost <= self.budget_tokens:
+                system = system + [summary]
+                used += cost
+
+        window = system + [m for unit in kept for m in unit]
+        return Window(window, used, len(dropped))
@@ -1,10 +1,15 @@
 import os
 import json
+import threading
+from collections import namedtuple
 from openai import OpenAI
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
-# Initialize the OpenAI client (assumes OPENAI_API_KEY is set)
-client = OpenAI()
+from chaldal_repository import (
+    CANCELLED, NOT_CANCELLABLE, ORDER_NOT_FOUND, USER_KEYS,
+    OrderRepository, SqliteOrderRepository, user_not_found,
+)
+from tool_cache import ToolResultCache
 
 ################################################################################
 # 1) Define Pydantic Models for Function Parameters
@@ -35,9 +40,16 @@ params_model_map = {
 # 2) Fake Database and Tool-Dispatch
 ################################################################################
 
-class FakeDatabase:
-    def __init__(self):
-        self.customers = [
+class FakeDatabase(OrderRepository):
+    """
+    In-memory customers and orders. Lookups go through hash indexes built once
+    here and kept up to date by add_customer/add_order, so they cost the same
+    however many customers there are. The indexes hold the same dicts as the
+    lists, so an order's status change is seen through every index.
+    """
+    def __init__(self, customers=None, orders=None):
+        if customers is None:
+            customers = [
             {"id": "1213210", "name": "John Doe", "email": "john@gmail.com", "phone": "123-456-7890", "username": "johndoe"},
             {"id": "2837622", "name": "Priya Patel", "email": "priya@candy.com", "phone": "987-654-3210", "username": "priya123"},
             {"id": "3924156", "name": "Liam Nguyen", "email": "lnguyen@yahoo.com", "phone": "555-123-4567", "username": "liamn"},
@@ -49,7 +61,8 @@ class FakeDatabase:
             {"id": "9603481", "name": "Kwame Osei", "email": "kwameo@yahoo.com", "phone": "999-000-1111", "username": "kwameo"},
             {"id": "1057426", "name": "Mei Lin", "email": "meilin@gmail.com", "phone": "333-444-5555", "username": "mlin"}
         ]
-        self.orders = [
+        if orders is None:
+            orders = [
             {"id": "24601", "customer_id": "1213210", "product": "Wireless Headphones", "quantity": 1, "price": 79.99, "status": "Shipped"},
             {"id": "13579", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 2, "price": 19.99, "status": "Processing"},
             {"id": "97531", "customer_id": "2837622", "product": "Bluetooth Speaker", "quantity": 1, "price": "49.99", "status": "Shipped"},
@@ -64,48 +77,257 @@ class FakeDatabase:
             {"id": "90357", "customer_id": "1213210", "product": "Smartphone Case", "quantity": 1, "price": 19.99, "status": "Shipped"},
             {"id": "28164", "customer_id": "2837622", "product": "Wireless Headphones", "quantity": 2, "price": 79.99, "status": "Processing"}
         ]
+        self.customers = []
+        self.orders = []
+        # Server mode runs tools on worker threads; cancel_order checks then sets.
+        self._lock = threading.Lock()
+        self.users_by = {key: {} for key in USER_KEYS}
+        self.orders_by_id = {}
+        self.orders_by_customer = {}
+        for customer in customers:
+            self.add_customer(customer)
+        for order in orders:
+            self.add_order(order)
+    
+    def add_customer(self, customer):
+        self.customers.append(customer)
+        for key in USER_KEYS:
+            # Like the old scan, the first customer with a value wins.
+            self.users_by[key].setdefault(customer[key], customer)
+    
+    def add_order(self, order):
+        self.orders.append(order)
+        self.orders_by_id.setdefault(order["id"], order)
+        self.orders_by_customer.setdefault(order["customer_id"], []).append(order)
     
     def get_user(self, key, value):
-        if key in {"email", "phone", "username"}:
-            for customer in self.customers:
-                if customer[key] == value:
-                    return customer
-            return f"Couldn't find a user with {key} of {value}"
+        if key in self.users_by:
+            customer = self.users_by[key].get(value)
+            if customer is not None:
+                return customer
+            return user_not_found(key, value)
         else:
             raise ValueError(f"Invalid key: {key}")
     
     def get_order_by_id(self, order_id):
-        for order in self.orders:
-            if order["id"] == order_id:
-                return order
-        return None
+        return self.orders_by_id.get(order_id)
     
     def get_customer_orders(self, customer_id):
-        return [order for order in self.orders if order["customer_id"] == customer_id]
+        return list(self.orders_by_customer.get(customer_id, ()))
     
     def cancel_order(self, order_id):
-        order = self.get_order_by_id(order_id)
+        order = self.orders_by_id.get(order_id)
         if order:
-            if order["status"] == "Processing":
-                order["status"] = "Cancelled"
-                return "Cancelled the order"
-            else:
-                return "Order has already shipped. Can't cancel it."
-        return "Can't find that order!"
-
-db = FakeDatabase()
-
-def process_tool_call(tool_name, tool_input):
-    if tool_name == "get_user":
-        return db.get_user(tool_input["key"], tool_input["value"])
-    elif tool_name == "get_order_by_id":
-        return db.get_order_by_id(tool_input["order_id"])
-    elif tool_name == "get_customer_orders":
-        return db.get_customer_orders(tool_input["customer_id"])
-    elif tool_name == "cancel_order":
-        return db.cancel_order(tool_input["order_id"])
-    else:
+            with self._lock:
+                if order["status"] == "Processing":
+                    order["status"] = "Cancelled"
+                    return CANCELLED
+            return NOT_CANCELLABLE
+        return ORDER_NOT_FOUND
+
+def open_repository():
+    """
+    The store the bot works against. Set CHALDAL_DB to an SQLite file path to
+    keep orders across restarts and share them between bot processes; it is
+    filled with the sample data the first time.
+    """
+    if not os.environ.get("CHALDAL_DB"):
+        return FakeDatabase()
+    repo = SqliteOrderRepository(os.environ["CHALDAL_DB"])
+    if repo.is_empty():
+        sample = FakeDatabase()
+        repo.load(sample.customers, sample.orders)
+    return repo
+
+db = open_repository()
+
+# Shared by every conversation in this process. CHALDAL_CACHE_TTL=0 turns it off.
+CACHE_TTL = float(os.environ.get("CHALDAL_CACHE_TTL", "30"))
+tool_cache = ToolResultCache(ttl_seconds=CACHE_TTL) if CACHE_TTL > 0 else None
+
+# Handlers take the repository and the validated params model, not a dict.
+# Every tool declares its effect when registered: read-only tools may have
+# their results cached, tagged with the records they read; a mutating tool
+# invalidates the tags of the records it writes, or the whole cache if it
+# does not say which.
+#
+# A tool can also have a `reply` template. When a result needs no wording
+# from the model (a cancel outcome, a missing order) it returns the final
+# answer, and with fast replies on the turn ends without a second completion.
+ToolSpec = namedtuple("ToolSpec", ["read_only", "tags", "invalidates", "reply"])
+
+tool_handlers = {}
+tool_specs = {}
+
+def tool(name, read_only, tags=None, invalidates=None, reply=None):
+    """
+    Register a handler. `tags(params, result)` names what a read-only result
+    depends on; `invalidates(repo, params)` names what a write will change and
+    is called before the handler runs. `reply(repo, params, result)` returns
+    the answer to give the customer, or None when the model should write it.
+    """
+    def register(handler):
+        tool_handlers[name] = handler
+        tool_specs[name] = ToolSpec(read_only, tags, invalidates, reply)
+        return handler
+    return register
+
+def record_tags(result):
+    """Cache tags for a customer, an order, or a list of them."""
+    records = result if isinstance(result, list) else [result]
+    tags = set()
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        if "customer_id" in record:
+            tags.add(f"order:{record['id']}")
+            tags.add(f"customer:{record['customer_id']}")
+        else:
+            tags.add(f"customer:{record['id']}")
+    return tags
+
+def get_user_reply(repo, params, result):
+    # A found customer usually leads to another lookup; only a miss is final.
+    if isinstance(result, str):
+        return f"I couldn't find an account with the {params.key} {params.value}. Could you double-check it?"
+    return None
+
+def order_reply(repo, params, result):
+    if result is None:
+        return f"I couldn't find an order with the id {params.order_id}. Could you double-check the number?"
+    if result["status"] == "Processing":
+        return None  # looked up on the way to changing it, often
+    return (f"Order {result['id']}: {result['quantity']} x {result['product']} "
+            f"at {result['price']} each. Status: {result['status']}.")
+
+def customer_orders_reply(repo, params, result):
+    # Listing orders is often a step towards something else, so only "none" is final.
+    if not result:
+        return "I don't see any orders on that account."
+    return None
+
+def cancel_reply(repo, params, result):
+    if result == CANCELLED:
+        return f"Done, order {params.order_id} has been cancelled."
+    if result == NOT_CANCELLABLE:
+        # The repository says the same for every status past Processing, so word it from the order itself.
+        order = repo.get_order_by_id(params.order_id)
+        status = order["status"] if order else None
+        if status == "Shipped":
+            return f"Order {params.order_id} has already shipped, so it can no longer be cancelled."
+        if status == "Delivered":
+            return f"Order {params.order_id} has already been delivered, so it can no longer be cancelled."
+        if status == "Cancelled":
+            return f"Order {params.order_id} is already cancelled."
+        return None
+    if result == ORDER_NOT_FOUND:
+        return f"I couldn't find an order with the id {params.order_id}. Could you double-check the number?"
+    return None
+
+@tool("get_user", read_only=True, tags=lambda params, result: record_tags(result), reply=get_user_reply)
+def handle_get_user(repo, params: GetUserParams):
+    return repo.get_user(params.key, params.value)
+
+@tool("get_order_by_id", read_only=True,
+      tags=lambda params, result: record_tags(result) | {f"order:{params.order_id}"}, reply=order_reply)
+def handle_get_order_by_id(repo, params: GetOrderByIdParams):
+    return repo.get_order_by_id(params.order_id)
+
+@tool("get_customer_orders", read_only=True,
+      tags=lambda params, result: record_tags(result) | {f"customer:{params.customer_id}"},
+      reply=customer_orders_reply)
+def handle_get_customer_orders(repo, params: GetCustomerOrdersParams):
+    return repo.get_customer_orders(params.customer_id)
+
+def cancel_order_invalidates(repo, params):
+    order = repo.get_order_by_id(params.order_id)
+    return record_tags(order) | {f"order:{params.order_id}"}
+
+@tool("cancel_order", read_only=False, invalidates=cancel_order_invalidates, reply=cancel_reply)
+def handle_cancel_order(repo, params: CancelOrderParams):
+    return repo.cancel_order(params.order_id)
+
+def cache_key(params):
+    # The params models are flat, so their field values make a cheap key.
+    key = tuple(params.__dict__.values())
+    try:
+        hash(key)
+    except TypeError:
+        return params.model_dump_json()
+    return key
+
+def call_tool(function_name, params, repo=None, cache=None):
+    """
+    Run a registered tool on validated params. Without an explicit repo the
+    module's `db` and `tool_cache` are used.
+    """
+    if repo is None:
+        repo = db
+        if cache is None:
+            cache = tool_cache
+    handler = tool_handlers[function_name]
+    effects = tool_specs[function_name]
+    if cache is None:
+        return handler(repo, params)
+    if effects.read_only:
+        key = cache_key(params)
+        hit, result = cache.get(function_name, key)
+        if not hit:
+            since = cache.generation()
+            result = handler(repo, params)
+            cache.put(function_name, key, result, effects.tags(params, result) if effects.tags else (), since)
+        return result
+    stale = effects.invalidates(repo, params) if effects.invalidates else None
+    try:
+        return handler(repo, params)
+    finally:
+        if stale is None:
+            cache.clear()
+        else:
+            cache.invalidate(stale)
+
+def run_tool_call(function_name, arguments, repo=None):
+    """
+    Run a tool call from the model's raw JSON arguments. They are parsed
+    straight into the tool's params model with model_validate_json (pydantic
+    builds each model's validator once, when the class is defined), and the
+    typed object goes to the handler. Failures are returned as the tool
+    result, for the model to see, rather than raised.
+
+    Returns (result, reply): reply is the tool's templated answer for the
+    result, or None when it has none or the call failed.
+    """
+    params_model = params_model_map.get(function_name)
+    if params_model is None:
+        return f"Unknown tool: {function_name}", None
+    try:
+        params = params_model.model_validate_json(arguments)
+    except ValidationError as e:
+        return f"Error: invalid arguments for {function_name}: {e}", None
+    try:
+        result = call_tool(function_name, params, repo)
+    except Exception as e:
+        return f"Error: {str(e)}", None
+    reply = tool_specs[function_name].reply
+    if reply is None:
+        return result, None
+    try:
+        return result, reply(db if repo is None else repo, params, result)
+    except Exception:
+        # The tool itself succeeded; without a reply the model answers as usual.
+        return result, None
+
+def fast_reply(replies):
+    """The turn's final answer if every tool call in it has a templated reply."""
+    if not replies or any(reply is None for reply in replies):
+        return None
+    return " ".join(replies)
+
+def process_tool_call(tool_name, tool_input, repo=None):
+    """Run a tool from an already-decoded arguments dict."""
+    if tool_name not in tool_handlers:
         return "Unknown tool!"
+    return call_tool(tool_name, params_model_map[tool_name].model_validate(tool_input), repo)
 
 ################################################################################
 # 3) Define OpenAI Tools Using Pydantic
@@ -146,20 +368,27 @@ tools = [
     }
 ]
 
+MODEL = "gpt-4o"
+SYSTEM_MESSAGE = "You are a TechNova Customer Support agent. Be helpful, professional, and concise."
+# Answer from the tools' reply templates when they have one, instead of a second completion.
+FAST_REPLIES = os.environ.get("CHALDAL_FAST_REPLIES") == "1"
+
 ################################################################################
 # 4) A Simple Chat Loop with Function Calling Using the Latest API
 ################################################################################
 
-def simple_chat():
+def simple_chat(fast_replies=FAST_REPLIES):
     """
     Continuously prompt the user for input, send the conversation to the
     OpenAI ChatCompletion endpoint with tool definitions, and handle
     tool calls or direct responses.
     """
+    # Assumes OPENAI_API_KEY is set
+    client = OpenAI()
     messages = []
     system_message = {
         "role": "system",
-        "content": "You are a TechNova Customer Support agent. Be helpful, professional, and concise."
+        "content": SYSTEM_MESSAGE
     }
     messages.append(system_message)
     
@@ -175,7 +404,7 @@ def simple_chat():
 
         while True:
             response = client.chat.completions.create(
-                model="gpt-4o",
+                model=MODEL,
                 messages=messages,
                 tools=tools,
                 tool_choice="auto"
@@ -189,26 +418,16 @@ def simple_chat():
                 messages.append(assistant_message)
                 
                 # Process each tool call
+                replies = []
                 for tool_call in assistant_message.tool_calls:
                     function_name = tool_call.function.name
-                    try:
-                        function_args = json.loads(tool_call.function.arguments)
-                    except Exception as e:
-                        print(f"Error parsing tool arguments: {e}")
-                        break
-
-                    print(f"\n[Assistant is calling the tool: {function_name} with args={function_args}]")
-
-                    try:
-                        # Validate parameters
-                        if function_name in params_model_map:
-                            params = params_model_map[function_name](**function_args)
-                            tool_result = process_tool_call(function_name, function_args)
-                        else:
-                            tool_result = f"Unknown tool: {function_name}"
-                    except Exception as e:
-                        print(f"Error validating tool arguments: {e}")
-                        tool_result = f"Error: {str(e)}"
+                    print(f"\n[Assistant is calling the tool: {function_name} with args={tool_call.function.arguments}]")
+
+                    # Validated and run in one step; errors come back as the result
+                    tool_result, reply = run_tool_call(function_name, tool_call.function.arguments)
+                    replies.append(reply)
+                    if isinstance(tool_result, str) and tool_result.startswith("Error"):
+                        print(tool_result)
 
                     # Append the tool response
                     messages.append({
@@ -218,6 +437,13 @@ def simple_chat():
                         "content": json.dumps(tool_result)
                     })
                 
+                # The results speak for themselves: answer without the model
+                reply = fast_reply(replies) if fast_replies else None
+                if reply is not None:
+                    print("\nTechNova Support:", reply)
+                    messages.append({"role": "assistant", "content": reply})
+                    break
+
                 # Get the final response after tool use
                 continue
             else:
@@ -226,5 +452,140 @@ def simple_chat():
                 messages.append({"role": "assistant", "content": assistant_message.content})
                 break
 
+################################################################################
+# 5) Server Mode: Many Conversations in One Process
+################################################################################
+
+# Each conversation is its own messages list in a bounded session store. Model
+# calls are awaited on one shared AsyncOpenAI client, and tools run on worker
+# threads (the repository calls block), at most TOOL_WORKERS at a time.
+TOOL_WORKERS = int(os.environ.get("CHALDAL_TOOL_WORKERS", "8"))
+MAX_TOOL_ROUNDS = 5
+
+async def chat_turn_async(client, messages, tool_slots, repo=None, fast_replies=FAST_REPLIES, counters=None):
+    """
+    Run one customer turn on `messages` (updated in place) and return the
+    reply. `counters`, if given, counts model calls and fast replies.
+    """
+    import asyncio
+    from session_store import to_plain
+
+    if counters is None:
+        counters = {}
+    for _ in range(MAX_TOOL_ROUNDS):
+        counters["model_calls"] = counters.get("model_calls", 0) + 1
+        response = await client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto"
+        )
+        assistant_message = response.choices[0].message
+        if not assistant_message.tool_calls:
+            messages.append({"role": "assistant", "content": assistant_message.content})
+            return assistant_message.content
+
+        messages.append(to_plain(assistant_message))
+
+        async def run(tool_call):
+            async with tool_slots:
+                return await asyncio.to_thread(run_tool_call, tool_call.function.name, tool_call.function.arguments, repo)
+
+        results = await asyncio.gather(*(run(tool_call) for tool_call in assistant_message.tool_calls))
+        for tool_call, (tool_result, _) in zip(assistant_message.tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "name": tool_call.function.name,
+                "content": json.dumps(tool_result)
+            })
+        reply = fast_reply([reply for _, reply in results]) if fast_replies else None
+        if reply is not None:
+            counters["fast_replies"] = counters.get("fast_replies", 0) + 1
+            messages.append({"role": "assistant", "content": reply})
+            return reply
+    reply = "Sorry, I couldn't finish looking that up. Please try again."
+    messages.append({"role": "assistant", "content": reply})
+    return reply
+
+def make_app(repo=None, tool_workers=TOOL_WORKERS, max_conversations=10000, fast_replies=FAST_REPLIES):
+    """
+    aiohttp app serving support conversations:
+
+        POST   /chat        {"conversation_id": "...", "text": "..."} -> {"text": "..."}
+        DELETE /chat/{id}   end a conversation
+    """
+    import asyncio
+    from aiohttp import web
+    import transport
+    from session_store import MemorySessionStore
+
+    conversations = MemorySessionStore(max_sessions=max_conversations)
+    busy = set()
+    state = {}
+    counters = {"model_calls": 0, "fast_replies": 0}
+
+    async def startup(app):
+        state["client"] = transport.async_openai_client()
+        state["tool_slots"] = asyncio.Semaphore(tool_workers)
+
+    async def cleanup(app):
+        await state["client"].close()
+        transport.async_openai_client.cache_clear()
+
+    async def chat(request):
+        payload = await request.json()
+        conversation_id = str(payload["conversation_id"])
+        if conversation_id in busy:
+            return web.json_response({"error": "A reply to this conversation is still in progress"}, status=409)
+        busy.add(conversation_id)
+        try:
+            # A copy, so a failed turn leaves the stored conversation as it was.
+            messages = list(conversations.load(conversation_id) or [{"role": "system", "content": SYSTEM_MESSAGE}])
+            messages.append({"role": "user", "content": payload["text"]})
+            reply = await chat_turn_async(state["client"], messages, state["tool_slots"], repo,
+                                          fast_replies, counters)
+            conversations.save(conversation_id, messages)
+        finally:
+            busy.discard(conversation_id)
+        return web.json_response({"text": reply})
+
+    async def end(request):
+        conversations.drop(request.match_info["conversation_id"])
+        return web.json_response({})
+
+    async def stats(request):
+        return web.json_response({
+            "conversations": conversations.stats(),
+            "turns": counters,
+            "tool_cache": tool_cache.stats() if tool_cache is not None else None,
+        })
+
+    app = web.Application()
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    app.router.add_post("/chat", chat)
+    app.router.add_delete("/chat/{conversation_id}", end)
+    app.router.add_get("/stats", stats)
+    return app
+
+def serve(host="127.0.0.1", port=6005, tool_workers=TOOL_WORKERS, fast_replies=FAST_REPLIES):
+    from aiohttp import web
+
+    web.run_app(make_app(tool_workers=tool_workers, fast_replies=fast_replies), host=host, port=port, access_log=None)
+
 if __name__ == "__main__":
-    simple_chat()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TechNova customer support bot")
+    parser.add_argument("--serve", action="store_true", help="Serve many conversations over HTTP instead of chatting here")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6005)
+    parser.add_argument("--tool-workers", type=int, default=TOOL_WORKERS, help="Tool calls run at once")
+    parser.add_argument("--fast-replies", action="store_true", default=FAST_REPLIES,
+                        help="Answer simple tool results from templates, skipping the second model call")
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.host, args.port, args.tool_workers, args.fast_replies)
+    else:
+        simple_chat(args.fast_replies)
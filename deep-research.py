@@ -3,6 +3,7 @@ import aiohttp
 from bs4 import BeautifulSoup
 from pydantic import BaseModel, Field
 
+import transport
 from agents import Agent, Runner, WebSearchTool, function_tool, trace, gen_trace_id
 
 # Simple models with minimal schema
@@ -25,28 +26,28 @@ async def read_webpage(url: str) -> str:
         The extracted text content from the webpage
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Remove script and style elements
-                    for script in soup(["script", "style"]):
-                        script.extract()
-                    
-                    # Extract text
-                    text = soup.get_text(separator='\n')
-                    
-                    # Clean up text (remove extra whitespace)
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = '\n'.join(chunk for chunk in chunks if chunk)
-                    
-                    # Return a reasonable amount of text
-                    return text[:8000] + "..." if len(text) > 8000 else text
-                else:
-                    return f"Failed to retrieve the webpage. Status code: {response.status}"
+        session = transport.aiohttp_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status == 200:
+                html = await response.text()
+                soup = BeautifulSoup(html, 'html.parser')
+                
+                # Remove script and style elements
+                for script in soup(["script", "style"]):
+                    script.extract()
+                
+                # Extract text
+                text = soup.get_text(separator='\n')
+                
+                # Clean up text (remove extra whitespace)
+                lines = (line.strip() for line in text.splitlines())
+                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+                text = '\n'.join(chunk for chunk in chunks if chunk)
+                
+                # Return a reasonable amount of text
+                return text[:8000] + "..." if len(text) > 8000 else text
+            else:
+                return f"Failed to retrieve the webpage. Status code: {response.status}"
     except Exception as e:
         return f"Error reading webpage: {str(e)}"
 
@@ -141,8 +142,11 @@ async def main():
     # Get the research query from the user
     query = input("What would you like to research? ")
     
-    # Perform the research
-    report = await perform_research(query)
+    # Perform the research; the webpage reads share one pooled session
+    try:
+        report = await perform_research(query)
+    finally:
+        await transport.close_aiohttp_session()
     
     # Display the results
     print("\n----- RESEARCH REPORT -----\n")
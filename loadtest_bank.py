@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Load test for the bank bot's `/` endpoint: sync Flask (app_flask.py) versus
+async ASGI (app_asgi.py), both talking to model_stub.py instead of OpenAI.
+
+Usage:
+    python loadtest_bank.py --requests 500 --concurrency 100 --latency 0.25
+
+Every request is a fresh sender_id, so each one is a full turn: tool call,
+tool execution and the follow-up completion (two stubbed model round trips).
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUB_PORT = 8790
+SYNC_PORT = 6003
+ASYNC_PORT = 6004
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def spawn(args, env):
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=HERE,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def async_server_args():
+    # Prefer a real ASGI server; Quart's own runner is fine as a fallback.
+    if importlib.util.find_spec("uvicorn"):
+        return ["-m", "uvicorn", "app_asgi:app", "--port", str(ASYNC_PORT), "--backlog", "4096", "--no-access-log"]
+    if importlib.util.find_spec("hypercorn"):
+        return ["-m", "hypercorn", "app_asgi:app", "--bind", f"127.0.0.1:{ASYNC_PORT}", "--backlog", "4096"]
+    return ["app_asgi.py"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def drive(port, total, concurrency):
+    url = f"http://127.0.0.1:{port}/"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(session, i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json={"sender_id": f"load-{port}-{i}", "text": "What is my account balance?"}) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                        return
+            except aiohttp.ClientError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(session, i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "p50": percentile(latencies, 50) if latencies else float("nan"),
+        "p99": percentile(latencies, 99) if latencies else float("nan"),
+        "mean": statistics.mean(latencies) if latencies else float("nan"),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+def report(name, result):
+    print(
+        f"{name:<6} ok={result['ok']:<5} errors={result['errors']:<4} "
+        f"p50={result['p50'] * 1000:8.1f}ms  p99={result['p99'] * 1000:8.1f}ms  "
+        f"mean={result['mean'] * 1000:8.1f}ms  rps={result['rps']:8.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async load test for the bank bot")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per server")
+    parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.25, help="Stubbed model latency in seconds")
+    parser.add_argument("--only", choices=["sync", "async"], help="Test a single server")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    env["OPENAI_API_KEY"] = "stub"
+
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency)], env)
+    try:
+        wait_for_port(STUB_PORT)
+        targets = [("sync", ["app_flask.py"], SYNC_PORT), ("async", async_server_args(), ASYNC_PORT)]
+        print(f"{args.requests} requests, concurrency {args.concurrency}, model latency {args.latency}s\n")
+        for name, server_args, port in targets:
+            if args.only and args.only != name:
+                continue
+            server = spawn(server_args, env)
+            try:
+                wait_for_port(port)
+                report(name, asyncio.run(drive(port, args.requests, args.concurrency)))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Load test for the Chaldal support bot's server mode
+(`custom_support_chaldal.py --serve`), against model_stub.py instead of OpenAI.
+
+Usage:
+    python loadtest_chaldal.py --conversations 300 --concurrency 100 --turns 3 --latency 0.25
+
+Each simulated customer opens a conversation, sends --turns messages one
+after another (waiting for every reply, like a person would) and ends it.
+With tools offered the stub calls one on every turn, so a turn is two model
+round trips and one tool call.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+
+from loadtest_bank import percentile, spawn, wait_for_port
+
+STUB_PORT = 8793
+SERVER_PORT = 6005
+CUSTOMER_LINES = [
+    "Hi, I'd like to check on my order.",
+    "My email is john@gmail.com.",
+    "Can you cancel order 13579?",
+    "Thanks, that's all.",
+]
+
+
+async def drive(port, conversations, concurrency, turns):
+    base = f"http://127.0.0.1:{port}"
+    semaphore = asyncio.Semaphore(concurrency)
+    turn_latencies = []
+    errors = 0
+    completed = 0
+
+    async def customer(session, i):
+        nonlocal errors, completed
+        conversation_id = f"load-{i}"
+        async with semaphore:
+            try:
+                for turn in range(turns):
+                    started = time.perf_counter()
+                    text = CUSTOMER_LINES[turn % len(CUSTOMER_LINES)]
+                    async with session.post(f"{base}/chat", json={"conversation_id": conversation_id, "text": text}) as resp:
+                        await resp.read()
+                        if resp.status != 200:
+                            errors += 1
+                            return
+                    turn_latencies.append(time.perf_counter() - started)
+                async with session.delete(f"{base}/chat/{conversation_id}") as resp:
+                    await resp.read()
+            except aiohttp.ClientError:
+                errors += 1
+                return
+            completed += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(customer(session, i) for i in range(conversations)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "conversations": completed,
+        "errors": errors,
+        "turns": len(turn_latencies),
+        "p50": percentile(turn_latencies, 50) if turn_latencies else float("nan"),
+        "p99": percentile(turn_latencies, 99) if turn_latencies else float("nan"),
+        "mean": statistics.mean(turn_latencies) if turn_latencies else float("nan"),
+        "elapsed": elapsed,
+    }
+
+
+def report(result):
+    elapsed = result["elapsed"]
+    print(
+        f"conversations={result['conversations']:<5} errors={result['errors']:<4} "
+        f"turn p50={result['p50'] * 1000:7.1f}ms  p99={result['p99'] * 1000:7.1f}ms  "
+        f"mean={result['mean'] * 1000:7.1f}ms\n"
+        f"{result['conversations'] / elapsed:8.1f} conversations/s  "
+        f"{result['turns'] / elapsed:8.1f} turns/s  in {elapsed:.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for custom_support_chaldal.py --serve")
+    parser.add_argument("--conversations", type=int, default=300, help="Simulated customers in total")
+    parser.add_argument("--concurrency", type=int, default=100, help="Customers talking at once")
+    parser.add_argument("--turns", type=int, default=3, help="Messages each customer sends")
+    parser.add_argument("--latency", type=float, default=0.25, help="Stubbed model latency in seconds")
+    parser.add_argument("--tool-workers", type=int, default=8, help="Server's concurrent tool calls")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+    env["OPENAI_API_KEY"] = "stub"
+
+    stub = spawn(["model_stub.py", "--port", str(STUB_PORT), "--latency", str(args.latency)], env)
+    server = spawn(["custom_support_chaldal.py", "--serve", "--port", str(SERVER_PORT),
+                    "--tool-workers", str(args.tool_workers)], env)
+    try:
+        wait_for_port(STUB_PORT)
+        wait_for_port(SERVER_PORT)
+        print(f"{args.conversations} conversations of {args.turns} turns, concurrency {args.concurrency}, "
+              f"model latency {args.latency}s, {args.tool_workers} tool workers\n")
+        report(asyncio.run(drive(SERVER_PORT, args.conversations, args.concurrency, args.turns)))
+    finally:
+        server.terminate()
+        server.wait()
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
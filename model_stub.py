@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the OpenAI chat completions endpoint, for load tests and
+benchmarks that should measure our code rather than the model.
+
+Point any OpenAI client at it with:
+    export OPENAI_BASE_URL=http://127.0.0.1:8790/v1
+    export OPENAI_API_KEY=stub
+
+Behaviour:
+- If tools are offered and the last message is from the user, the stub calls a
+  tool (the forced one when tool_choice names it, otherwise the first, or the
+  first --tool-calls tools at once) with arguments filled in from the tool's
+  JSON schema.
+- Otherwise it answers with a short canned text reply.
+- Every response waits --latency seconds first, to mimic model time.
+- stream=True is answered with server-sent events, like the real API.
+- With --certfile/--keyfile it serves HTTPS, for measuring TLS handshakes.
+- With --rate-limit N it accepts at most N requests per second (bursts up to
+  N) and answers the rest with 429 and a Retry-After header, like the real API.
+- When the user message holds <doc id="..."> blocks, an array of objects with
+  an "id" field gets one entry per document, carrying its id. --bad-items P
+  leaves out or garbles each of those entries with probability P.
+- --output-token-latency adds that many seconds per generated token on top of
+  --latency, so long outputs take longer, as they do from a real model;
+  --input-token-latency does the same per prompt token, for long prompts.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import ssl
+import time
+import uuid
+
+from aiohttp import web
+
+REPLY_WORDS = "Your request has been processed successfully and the details are shown above".split()
+DOC_ID = re.compile(r'<doc id="([^"]+)">')
+
+
+def fake_value(schema, root, doc_ids=(), bad_items=0.0):
+    """Build a plausible value for a JSON schema node."""
+    if "$ref" in schema:
+        name = schema["$ref"].rsplit("/", 1)[-1]
+        return fake_value(root.get("$defs", {}).get(name, {}), root, doc_ids, bad_items)
+    if "anyOf" in schema:
+        return fake_value(schema["anyOf"][0], root, doc_ids, bad_items)
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type")
+    if kind == "string":
+        return "1234"
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 0.5
+    if kind == "boolean":
+        return True
+    if kind == "array":
+        items = schema.get("items", {})
+        if doc_ids and "id" in items.get("properties", {}):
+            return per_document(items, root, doc_ids, bad_items)
+        return [fake_value(items, root, doc_ids, bad_items)]
+    if kind == "object" or "properties" in schema:
+        return {
+            key: fake_value(value, root, doc_ids, bad_items)
+            for key, value in schema.get("properties", {}).items()
+        }
+    return None
+
+
+def per_document(items, root, doc_ids, bad_items):
+    entries = []
+    for doc_id in doc_ids:
+        entry = fake_value(items, root)
+        entry["id"] = doc_id
+        if random.random() < bad_items:
+            if random.random() < 0.5:
+                continue
+            entry = {key: "n/a" for key in entry}
+            entry["id"] = doc_id
+        entries.append(entry)
+    return entries
+
+
+def pick_tools(body, tool_calls):
+    tools = body.get("tools") or []
+    messages = body.get("messages") or []
+    tool_choice = body.get("tool_choice", "auto")
+    if not tools or tool_choice == "none" or not messages:
+        return []
+    if messages[-1].get("role") != "user":
+        return []
+    if isinstance(tool_choice, dict):
+        wanted = tool_choice.get("function", {}).get("name")
+        return [tool for tool in tools if tool["function"]["name"] == wanted][:1]
+    return tools[:tool_calls]
+
+
+def estimate_tokens(payload):
+    return max(1, len(json.dumps(payload)) // 4)
+
+
+def build_reply(body, reply_words, tool_calls=1, bad_items=0.0):
+    """Return (content, tool_calls) for a request body."""
+    calls = []
+    tools = pick_tools(body, tool_calls)
+    doc_ids = DOC_ID.findall(str(body["messages"][-1].get("content"))) if tools else ()
+    for tool in tools:
+        schema = tool["function"].get("parameters", {})
+        calls.append({
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {
+                "name": tool["function"]["name"],
+                "arguments": json.dumps(fake_value(schema, schema, doc_ids, bad_items)),
+            },
+        })
+    if calls:
+        return None, calls
+    words = (REPLY_WORDS * (reply_words // len(REPLY_WORDS) + 1))[:reply_words]
+    return " ".join(words), None
+
+
+def completion_json(body, content, tool_calls):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "logprobs": None,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }
+        ],
+        "usage": usage_json(body, message),
+    }
+
+
+def usage_json(body, message):
+    prompt_tokens = estimate_tokens(body.get("messages", [])) + estimate_tokens(body.get("tools", []))
+    completion_tokens = estimate_tokens(message)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def chunk_json(body, completion_id, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+    }
+
+
+async def stream_reply(request, body, content, tool_calls, token_delay):
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    async def send(delta, finish_reason=None):
+        event = chunk_json(body, completion_id, delta, finish_reason)
+        await response.write(f"data: {json.dumps(event)}\n\n".encode())
+
+    await send({"role": "assistant", "content": ""})
+    if tool_calls:
+        for index, call in enumerate(tool_calls):
+            await send({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                        "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            for piece in re.findall(r".{1,16}", call["function"]["arguments"], re.S):
+                await send({"tool_calls": [{"index": index, "function": {"arguments": piece}}]})
+        await send({}, "tool_calls")
+    else:
+        for i, word in enumerate(content.split(" ")):
+            await send({"content": word if i == 0 else " " + word})
+            if token_delay:
+                await asyncio.sleep(token_delay)
+        await send({}, "stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        # Like the real API: one last chunk with no choices, only usage.
+        event = chunk_json(body, completion_id, {})
+        event["choices"] = []
+        event["usage"] = usage_json(body, {"role": "assistant", "content": content, "tool_calls": tool_calls})
+        await response.write(f"data: {json.dumps(event)}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+class RequestBucket:
+    """Token bucket for --rate-limit."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.limited = 0
+
+    def take(self):
+        """0 if the request may go ahead, else seconds until it could."""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        self.limited += 1
+        return (1 - self.tokens) / self.rate
+
+
+def make_app(latency=0.25, reply_words=14, token_delay=0.0, tool_calls=1, rate_limit=None,
+             bad_items=0.0, output_token_latency=0.0, input_token_latency=0.0):
+    bucket = RequestBucket(rate_limit) if rate_limit else None
+
+    async def chat_completions(request):
+        body = await request.json()
+        if bucket is not None:
+            wait = bucket.take()
+            if wait:
+                error = {"message": "Rate limit reached for requests", "type": "requests",
+                         "param": None, "code": "rate_limit_exceeded"}
+                return web.json_response({"error": error}, status=429, headers={"Retry-After": f"{wait:.3f}"})
+        content, tool_calls_made = build_reply(body, reply_words, tool_calls, bad_items)
+        output_tokens = estimate_tokens({"content": content, "tool_calls": tool_calls_made})
+        prompt_tokens = estimate_tokens(body.get("messages", [])) + estimate_tokens(body.get("tools", []))
+        await asyncio.sleep(latency + output_tokens * output_token_latency + prompt_tokens * input_token_latency)
+        if body.get("stream"):
+            return await stream_reply(request, body, content, tool_calls_made, token_delay)
+        return web.json_response(completion_json(body, content, tool_calls_made))
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)  # room for very long prompts
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/chat/completions", chat_completions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.25, help="Seconds to wait before each response")
+    parser.add_argument("--reply-words", type=int, default=14, help="Words in each text reply")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tools to call at once when tools are offered")
+    parser.add_argument("--certfile", help="Serve HTTPS with this certificate")
+    parser.add_argument("--keyfile", help="Private key for --certfile")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second to accept before answering 429")
+    parser.add_argument("--bad-items", type=float, default=0.0,
+                        help="Chance of leaving out or garbling each per-document entry")
+    parser.add_argument("--output-token-latency", type=float, default=0.0,
+                        help="Extra seconds per generated token")
+    parser.add_argument("--input-token-latency", type=float, default=0.0,
+                        help="Extra seconds per prompt token")
+    args = parser.parse_args()
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    web.run_app(
+        make_app(args.latency, args.reply_words, args.token_delay, args.tool_calls, args.rate_limit,
+                 args.bad_items, args.output_token_latency, args.input_token_latency),
+        host=args.host,
+        port=args.port,
+        access_log=None,
+        backlog=4096,
+        ssl_context=ssl_context,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,107 @@
 #!/usr/bin/env python3
+# Startup matters for a CLI that is run once per query: openai, tiktoken and
+# readline are imported only on the paths that use them (bench_startup.py).
 import argparse
-import json
 import os
 import sys
-import readline
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-import tiktoken
-from openai import OpenAI
+import transport
+from oa_journal import Journal
+from oa_sessions import DEFAULT_SESSION, SessionIndex
+from token_utils import TokenLedger, count_messages_tokens
 
-HISTORY_FILE = Path.home() / ".myopenai_history.json"
+HISTORY_FILE = Path.home() / ".myopenai_history.json"  # Whole-file format, read once to migrate
+JOURNAL_FILE = Path.home() / ".myopenai_history.jsonl"  # The default session's journal
+SESSIONS_DIR = Path.home() / ".myopenai_sessions"  # Index and journals of the named sessions
 MODEL = "gpt-4o"  # This model supports 128k context window
 MAX_RESPONSE_TOKENS = 4096  # Maximum tokens for the response
+MAX_CONTEXT_TOKENS = 128000 - MAX_RESPONSE_TOKENS  # Context window size for gpt-4o, less the response
+CONTINUE_PROMPT = "Your previous answer was cut off. Continue it exactly where it stopped, without repeating anything."
 
 def count_tokens(messages: List[Dict[str, Any]]) -> int:
     """Count the number of tokens in a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(MODEL)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")  # Default encoding
-    
-    num_tokens = 0
-    for message in messages:
-        # Every message follows <im_start>{role/name}\n{content}<im_end>\n
-        num_tokens += 4
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":  # If there's a name, the role is omitted
-                num_tokens -= 1  # Role is omitted
-    num_tokens += 2  # Every reply is primed with <im_start>assistant
-    return num_tokens
-
-def prune_messages_if_needed(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return count_messages_tokens(messages, MODEL)
+
+def prune_messages_if_needed(ledger: TokenLedger) -> TokenLedger:
     """Prune messages if they exceed the model's context window size."""
-    # Get accurate token count
-    token_count = count_tokens(messages)
-    
-    # Set context window size for gpt-4o
-    max_context_tokens = 128000 - MAX_RESPONSE_TOKENS
-    
-    # If we're within limits, return the original messages
-    if token_count <= max_context_tokens:
-        return messages
-    
-    # Start with all messages and keep removing the oldest until we're under the limit
-    pruned_messages = messages.copy()
-    
-    while token_count > max_context_tokens and len(pruned_messages) > 1:
-        # Remove the oldest non-system message
-        oldest_non_system_idx = next((i for i, msg in enumerate(pruned_messages) 
-                                     if msg["role"] != "system"), 0)
-        pruned_messages.pop(oldest_non_system_idx)
-        
-        # Recalculate token count
-        token_count = count_tokens(pruned_messages)
-    
-    return pruned_messages
-
-def load_history() -> List[Dict[str, Any]]:
-    """Load conversation history from file."""
-    if not HISTORY_FILE.exists():
-        return []
-    try:
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print("Warning: History file corrupted. Starting fresh.")
-        return []
+    # Each message was counted once when it was added, so pruning is a single
+    # pass over the stored counts with no re-encoding.
+    ledger.prune(MAX_CONTEXT_TOKENS)
+    return ledger
+
+@lru_cache(maxsize=None)
+def session_index() -> SessionIndex:
+    """The session index, opened once per run."""
+    return SessionIndex(SESSIONS_DIR, default_journal=JOURNAL_FILE)
+
+def open_journal(session: str = DEFAULT_SESSION) -> Journal:
+    """A session's history journal, migrated from the old JSON file on first use."""
+    journal = Journal(session_index().journal_path(session), retain_tokens=MAX_CONTEXT_TOKENS, model=MODEL)
+    if session == DEFAULT_SESSION:
+        journal.migrate_from(HISTORY_FILE)
+    return journal
+
+def load_history(session: str = DEFAULT_SESSION) -> List[Dict[str, Any]]:
+    """Load the most recent conversation history that fits the context window."""
+    return open_journal(session).load_tail(MAX_CONTEXT_TOKENS)
 
-def save_history(messages: List[Dict[str, Any]]) -> None:
-    """Save conversation history to file."""
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(messages, f, indent=2)
+def save_history(new_messages: List[Dict[str, Any]], session: str = DEFAULT_SESSION) -> None:
+    """Append this turn's messages to the session's history journal."""
+    open_journal(session).append(new_messages)
+    session_index().touch(session, len(new_messages))
 
-def get_openai_response(messages: List[Dict[str, Any]], stream: bool = True) -> str:
-    """Get response from OpenAI API."""
-    client = OpenAI()  # This will read the API key from OPENAI_API_KEY environment variable
+def clear_history(session: str = DEFAULT_SESSION) -> bool:
+    """Delete a session's conversation history. Returns False if there is no such session."""
+    path = session_index().journal_path(session, create=False)
+    if path is None:
+        return False
+    Journal(path).clear()
+    session_index().reset(session)
+    if session == DEFAULT_SESSION and HISTORY_FILE.exists():
+        HISTORY_FILE.unlink()
+    return True
+
+def delete_session(session: str) -> bool:
+    """Delete a session and its history. Returns False if there is no such session."""
+    deleted = session_index().delete(session)
+    # Otherwise the old JSON file would be migrated back in on the next run.
+    if session == DEFAULT_SESSION and HISTORY_FILE.exists():
+        HISTORY_FILE.unlink()
+        deleted = True
+    return deleted
+
+def fork_session(source: str, target: str) -> None:
+    """Start session `target` as a copy of session `source`."""
+    if source == DEFAULT_SESSION:
+        # Bring in the pre-sessions history first, as loading the session would.
+        open_journal(source)
+    session_index().fork(source, target)
+
+def list_sessions() -> None:
+    """Print the saved sessions, most recently used first."""
+    sessions = session_index().list()
+    if not sessions:
+        print("No saved sessions.")
+        return
+    for info in sessions:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.updated))
+        forked = f"  (forked from {info.parent})" if info.parent else ""
+        print(f"{info.name:<24} {info.messages:>6} messages  last used {updated}{forked}")
+
+def get_openai_response(messages: List[Dict[str, Any]], stream: bool = True, markdown: bool = False,
+                        journal: Optional[Journal] = None) -> Optional[str]:
+    """Get response from OpenAI API. Returns None if the answer was cut off."""
+    client = transport.openai_client()  # This will read the API key from OPENAI_API_KEY environment variable
+    partial = None
     
     try:
         if stream:
-            full_response = ""
+            from oa_render import StreamRenderer
+            
             response_stream = client.chat.completions.create(
                 model=MODEL,
                 messages=messages,
@@ -88,11 +109,16 @@ def get_openai_response(messages: List[Dict[str, Any]], stream: bool = True) ->
                 stream=True,
             )
             
-            for chunk in response_stream:
-                if chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    print(content, end="", flush=True)
-                    full_response += content
+            # Deltas are batched into a few writes a second by a writer thread,
+            # which also saves each batch to the journal as it goes
+            partial = journal.open_partial() if journal is not None else None
+            renderer = StreamRenderer(markdown=markdown, on_batch=partial.write if partial else None)
+            try:
+                for chunk in response_stream:
+                    if chunk.choices and chunk.choices[0].delta.content is not None:
+                        renderer.write(chunk.choices[0].delta.content)
+            finally:
+                full_response = renderer.close()
             
             print()  # Add a newline at the end
             return full_response
@@ -103,19 +129,44 @@ def get_openai_response(messages: List[Dict[str, Any]], stream: bool = True) ->
                 max_tokens=MAX_RESPONSE_TOKENS,
             )
             return response.choices[0].message.content
-    except Exception as e:
-        print(f"Error: {e}")
-        sys.exit(1)
+    except (Exception, KeyboardInterrupt) as e:
+        print()
+        print("Interrupted." if isinstance(e, KeyboardInterrupt) else f"Error: {e}")
+        if journal is not None and journal.pending_partial() is not None:
+            print("The partial answer is saved; use --continue (or type 'continue') to finish it.")
+        return None
+    finally:
+        if partial is not None:
+            partial.close()
 
-def interactive_mode(system_message=None, no_stream=False):
-    """Run the OpenAI CLI in interactive mode."""
-    print("Starting interactive chat with OpenAI gpt-4o model.")
-    print("Type 'exit', 'quit', or press Ctrl+D to end the conversation.")
-    print("Type 'clear' to clear the conversation history.")
-    print()
+def answer(ledger: TokenLedger, session: str, stream: bool, markdown: bool, partial: str = "") -> Optional[str]:
+    """
+    Get the assistant's reply to the conversation in `ledger` and save it.
+    With `partial`, replay an interrupted answer and ask only for the rest.
+    """
+    journal = open_journal(session)
+    messages = ledger.messages
+    if partial:
+        print(partial, end="", flush=True)
+        messages = messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ]
+    
+    response_text = get_openai_response(messages, stream, markdown, journal)
+    if response_text is None:
+        return None
     
+    # Save assistant's response to history; it supersedes the partial chunks
+    assistant_message = {"role": "assistant", "content": partial + response_text}
+    ledger.append(assistant_message)
+    save_history([assistant_message], session)
+    return assistant_message["content"]
+
+def start_ledger(session: str, system_message: Optional[str]) -> TokenLedger:
+    """The session's recent history behind the system message."""
     # Load history
-    messages = load_history()
+    messages = load_history(session)
     
     # Add or update system message
     system_msg = system_message or "You are a helpful assistant. Remember the context of our conversation and previous interactions. If asked about previous queries or our conversation history, provide a summary of what we've discussed so far."
@@ -125,6 +176,20 @@ def interactive_mode(system_message=None, no_stream=False):
     
     # Add the system message at the beginning
     messages.insert(0, {"role": "system", "content": system_msg})
+    return TokenLedger(messages, MODEL)
+
+def interactive_mode(system_message=None, no_stream=False, session=DEFAULT_SESSION, markdown=False):
+    """Run the OpenAI CLI in interactive mode."""
+    import readline  # noqa: F401 -- line editing and history for input()
+    
+    print(f"Starting interactive chat with OpenAI gpt-4o model (session '{session}').")
+    print("Type 'exit', 'quit', or press Ctrl+D to end the conversation.")
+    print("Type 'clear' to clear the conversation history, 'sessions' to list saved sessions.")
+    print("Type 'continue' to finish an answer that was cut off.")
+    print()
+    
+    ledger = start_ledger(session, system_message)
+    system_msg = ledger.messages[0]["content"]
     
     try:
         while True:
@@ -136,33 +201,42 @@ def interactive_mode(system_message=None, no_stream=False):
                 if user_input.lower() in ["exit", "quit"]:
                     break
                 elif user_input.lower() == "clear":
-                    if HISTORY_FILE.exists():
-                        HISTORY_FILE.unlink()
+                    clear_history(session)
                     print("Conversation history cleared.")
-                    messages = [{"role": "system", "content": system_msg}]
+                    ledger = TokenLedger([{"role": "system", "content": system_msg}], MODEL)
+                    continue
+                elif user_input.lower() == "sessions":
+                    list_sessions()
+                    continue
+                elif user_input.lower() == "continue":
+                    partial = open_journal(session).pending_partial()
+                    if partial is None:
+                        print("Nothing to continue.")
+                        continue
+                    print("\033[90m" + "-" * 50 + "\033[0m")  # Gray separator
+                    answer(ledger, session, not no_stream, markdown, partial)
+                    print("\033[90m" + "-" * 50 + "\033[0m")  # Gray separator
                     continue
                 elif user_input.strip() == "":
                     continue
                 
-                # Add user query
-                messages.append({"role": "user", "content": user_input})
+                # Add user query, saved now so it survives a failed answer
+                user_message = {"role": "user", "content": user_input}
+                ledger.append(user_message)
+                save_history([user_message], session)
                 
                 # Prune messages if needed to fit context window
-                messages = prune_messages_if_needed(messages)
+                ledger = prune_messages_if_needed(ledger)
                 
                 # Print a separator before the response
                 print("\033[90m" + "-" * 50 + "\033[0m")  # Gray separator
                 
-                # Get response
-                response_text = get_openai_response(messages, not no_stream)
+                # Get and save the response
+                answer(ledger, session, not no_stream, markdown)
                 
                 # Add another separator after the response
                 print("\033[90m" + "-" * 50 + "\033[0m")  # Gray separator
                 
-                # Save assistant's response to history
-                messages.append({"role": "assistant", "content": response_text})
-                save_history(messages)
-                
             except KeyboardInterrupt:
                 print("\nUse Ctrl+D or type 'exit' to exit.")
                 continue
@@ -171,15 +245,39 @@ def interactive_mode(system_message=None, no_stream=False):
         print("\nExiting chat. Conversation history saved.")
 
 def main():
-    parser = argparse.ArgumentParser(description="OpenAI CLI tool")
+    if sys.argv[1:2] == ["batch"]:
+        import oa_batch
+        sys.exit(oa_batch.main(sys.argv[2:], MODEL, MAX_RESPONSE_TOKENS))
+    
+    parser = argparse.ArgumentParser(description="OpenAI CLI tool",
+                                     epilog="Run 'oa-cli.py batch --help' to answer a JSONL file of prompts.")
     parser.add_argument("query", nargs="?", help="The query to send to OpenAI")
     parser.add_argument("-i", "--interactive", action="store_true", help="Start interactive mode")
     parser.add_argument("--clear", action="store_true", help="Clear conversation history")
     parser.add_argument("--no-stream", action="store_true", help="Disable streaming responses")
     parser.add_argument("--system", help="Set a system message for the conversation")
+    parser.add_argument("--markdown", action="store_true", help="Render streamed answers as markdown (needs rich)")
+    parser.add_argument("-s", "--session", default=DEFAULT_SESSION, help="Use the named session, creating it if new")
+    parser.add_argument("--resume", action="store_true", help="Continue the most recently used session")
+    parser.add_argument("--fork", metavar="NAME", help="Copy the session into a new session NAME and continue there")
+    parser.add_argument("--list-sessions", action="store_true", help="List saved sessions")
+    parser.add_argument("--delete-session", metavar="NAME", help="Delete a saved session")
+    parser.add_argument("--continue", dest="continue_answer", action="store_true",
+                        help="Finish the session's last answer if it was cut off")
     
     args = parser.parse_args()
     
+    if args.list_sessions:
+        list_sessions()
+        return
+    
+    if args.delete_session:
+        if not delete_session(args.delete_session):
+            print(f"No session named '{args.delete_session}'.")
+            sys.exit(1)
+        print(f"Session '{args.delete_session}' deleted.")
+        return
+    
     # Check for API key
     if "OPENAI_API_KEY" not in os.environ:
         print("Error: OPENAI_API_KEY environment variable not set.")
@@ -187,45 +285,58 @@ def main():
         print("export OPENAI_API_KEY='your-api-key'")
         sys.exit(1)
     
+    session = args.session
+    if args.resume:
+        session = session_index().latest() or DEFAULT_SESSION
+    
+    if args.fork:
+        try:
+            fork_session(session, args.fork)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"Forked session '{session}' into '{args.fork}'.")
+        session = args.fork
+    
     if args.clear:
-        if HISTORY_FILE.exists():
-            HISTORY_FILE.unlink()
+        if not clear_history(session):
+            print(f"No session named '{session}'.")
+            sys.exit(1)
         print("Conversation history cleared.")
         return
     
+    if args.continue_answer:
+        partial = open_journal(session).pending_partial()
+        if partial is None:
+            print("Nothing to continue.")
+            return
+        ledger = prune_messages_if_needed(start_ledger(session, args.system))
+        if answer(ledger, session, not args.no_stream, args.markdown, partial) is None:
+            sys.exit(1)
+        return
+    
     if args.interactive:
-        interactive_mode(args.system, args.no_stream)
+        interactive_mode(args.system, args.no_stream, session, args.markdown)
         return
     
     if not args.query:
         print("No query provided. Starting interactive mode...")
-        interactive_mode(args.system, args.no_stream)
+        interactive_mode(args.system, args.no_stream, session, args.markdown)
         return
     
-    # Load history
-    messages = load_history()
-    
-    # Add or update system message
-    system_msg = args.system or "You are a helpful assistant. Remember the context of our conversation and previous interactions. If asked about previous queries or our conversation history, provide a summary of what we've discussed so far."
-    
-    # Remove any existing system messages
-    messages = [msg for msg in messages if msg["role"] != "system"]
-    
-    # Add the system message at the beginning
-    messages.insert(0, {"role": "system", "content": system_msg})
+    ledger = start_ledger(session, args.system)
     
-    # Add user query
-    messages.append({"role": "user", "content": args.query})
+    # Add user query, saved now so it survives a failed answer
+    user_message = {"role": "user", "content": args.query}
+    ledger.append(user_message)
+    save_history([user_message], session)
     
     # Prune messages if needed to fit context window
-    messages = prune_messages_if_needed(messages)
-    
-    # Get response
-    response_text = get_openai_response(messages, not args.no_stream)
+    ledger = prune_messages_if_needed(ledger)
     
-    # Save assistant's response to history
-    messages.append({"role": "assistant", "content": response_text})
-    save_history(messages)
+    # Get and save the response
+    if answer(ledger, session, not args.no_stream, args.markdown) is None:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
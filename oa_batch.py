@@ -0,0 +1,212 @@
+"""
+Batch mode for oa-cli.py: answer a file of prompts concurrently.
+
+Input is JSON lines, one prompt per line: either a JSON string or an object
+with "prompt" (or a full "messages" list) and optional "id" and "system".
+Each prompt is answered independently, with no session history.
+
+A fixed pool of `workers` coroutines shares one AsyncOpenAI client, so
+connections are reused across prompts, and a token-bucket RateLimiter spaces
+out request starts. Results are written as JSON lines in input order as soon
+as every earlier prompt is done, so the output streams and a slow prompt holds
+back at most the results behind it.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import transport
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_prompt(line, system=None):
+    """(id, messages) for one input line."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"prompt": item}
+    if not isinstance(item, dict):
+        raise ValueError("expected a string or an object")
+    if "messages" in item:
+        messages = item["messages"]
+        if not isinstance(messages, list) or not all(isinstance(m, dict) and "role" in m for m in messages):
+            raise ValueError('"messages" must be a list of objects with a "role"')
+        messages = list(messages)
+    elif "prompt" in item:
+        messages = [{"role": "user", "content": item["prompt"]}]
+    else:
+        raise ValueError('expected "prompt" or "messages"')
+    system = item.get("system", system)
+    if system and not any(message.get("role") == "system" for message in messages):
+        messages.insert(0, {"role": "system", "content": system})
+    return item.get("id"), messages
+
+
+def read_prompts(lines, system=None):
+    """Yield (index, id, messages or None, error) for each non-blank input line."""
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            item_id, messages = parse_prompt(line, system)
+        except ValueError as e:
+            yield index, None, None, f"Bad input line: {e}"
+        else:
+            yield index, item_id, messages, None
+        index += 1
+
+
+class BatchReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies = []
+        self.ok = 0
+        self.failed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, result):
+        if result.get("error"):
+            self.failed += 1
+            return
+        self.ok += 1
+        self.latencies.append(result["seconds"])
+        usage = result.get("usage") or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        total = self.ok + self.failed
+        lines = [
+            f"{total} prompts ({self.ok} ok, {self.failed} failed) in {elapsed:.2f}s: "
+            f"{total / elapsed if elapsed else 0:.1f} prompts/s, "
+            f"{self.completion_tokens / elapsed if elapsed else 0:.0f} completion tokens/s"
+        ]
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            p50 = ordered[len(ordered) // 2]
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            lines.append(
+                f"latency p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms; "
+                f"tokens {self.prompt_tokens} prompt, {self.completion_tokens} completion"
+            )
+        return "\n".join(lines)
+
+
+async def answer_prompt(client, model, max_tokens, item_id, messages):
+    started = time.perf_counter()
+    result = {"id": item_id}
+    try:
+        response = await client.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    else:
+        result["answer"] = response.choices[0].message.content
+        result["finish_reason"] = response.choices[0].finish_reason
+        result["usage"] = response.usage.model_dump() if response.usage else None
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+async def run_batch(lines, out, model, max_tokens, workers=8, rate=None, burst=None, system=None, retries=2):
+    """Answer every prompt in `lines`, write results to `out` in input order, return a BatchReport."""
+    client = transport.async_openai_client().with_options(max_retries=retries)
+    limiter = RateLimiter(rate, burst or workers) if rate else None
+    prompts = read_prompts(lines, system)
+    report = BatchReport()
+    finished = {}
+    next_index = 0
+
+    def flush_ready():
+        nonlocal next_index
+        while next_index in finished:
+            out.write(json.dumps(finished.pop(next_index)) + "\n")
+            next_index += 1
+        out.flush()
+
+    async def worker():
+        # Workers share the `prompts` generator, so input is read as it is needed.
+        for index, item_id, messages, error in prompts:
+            if error is not None:
+                result = {"id": item_id, "error": error}
+            else:
+                if limiter is not None:
+                    await limiter.acquire()
+                result = await answer_prompt(client, model, max_tokens, item_id, messages)
+            result = {"index": index, **result}
+            report.add(result)
+            finished[index] = result
+            flush_ready()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return report
+
+
+async def run_batch_and_close(*args, **kwargs):
+    try:
+        return await run_batch(*args, **kwargs)
+    finally:
+        await transport.close_async_openai_client()
+
+
+def main(argv, model, max_tokens):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="oa-cli.py batch",
+        description="Answer a JSONL file of prompts concurrently and write JSONL results in input order",
+    )
+    parser.add_argument("input", nargs="?", default="-", help="JSONL prompts file ('-' or omitted for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Where to write JSONL results (default stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--rate", type=float, help="Most requests started per second")
+    parser.add_argument("--burst", type=int, help="Requests allowed at once before --rate applies (default --workers)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per prompt on rate limits and connection errors")
+    parser.add_argument("--system", help="System message for prompts that do not set their own")
+    parser.add_argument("--model", default=model, help=f"Model to use (default {model})")
+    parser.add_argument("--max-tokens", type=int, default=max_tokens, help="Most tokens per answer")
+    args = parser.parse_args(argv)
+
+    if "OPENAI_API_KEY" not in os.environ:
+        print("Error: OPENAI_API_KEY environment variable not set.", file=sys.stderr)
+        return 1
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r")
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        report = asyncio.run(run_batch_and_close(
+            source, out, args.model, args.max_tokens,
+            workers=args.workers, rate=args.rate, burst=args.burst,
+            system=args.system, retries=args.retries,
+        ))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(report.summary(), file=sys.stderr)
+    return 1 if report.failed else 0
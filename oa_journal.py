@@ -0,0 +1,234 @@
+"""
+Append-only conversation journal for oa-cli.py.
+
+The history is a JSON-lines file with one message per line. A turn appends
+only its new messages (flushed and fsynced), and startup reads the file
+backwards, parsing only the newest messages that fit the token budget.
+
+A write cut short by a crash leaves at most a torn last line. Readers skip it,
+and the next append trims it off first. Once the file grows past
+`compact_bytes` it is rewritten down to the messages that could still be
+loaded, through a temp file and os.replace(), so a crash during compaction
+leaves either the old file or the new one, never a mix.
+
+A streamed answer is saved as it arrives as `{"partial": true, "content": ...}`
+records. The complete assistant message appended when the stream finishes
+supersedes them; if the stream dies first, pending_partial() returns the text
+received so far so the answer can be continued instead of paid for again.
+"""
+import json
+import os
+from pathlib import Path
+
+from token_utils import DEFAULT_MODEL, count_message_tokens
+
+BLOCK_SIZE = 64 * 1024
+
+
+def fsync_directory(path):
+    # Makes a rename or a new file in `path` itself durable (POSIX only).
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def lines_from_end(f, block_size=BLOCK_SIZE):
+    """Yield the lines of a binary file, last line first."""
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    rest = b""
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        lines = (f.read(size) + rest).split(b"\n")
+        # The first piece may be the end of a line that starts in an earlier block.
+        rest = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line
+    if rest:
+        yield rest
+
+
+class Journal:
+    def __init__(self, path, retain_tokens=128000, compact_bytes=8 * 1024 * 1024, model=DEFAULT_MODEL):
+        self.path = Path(path)
+        # Compaction keeps the newest messages worth this many tokens.
+        self.retain_tokens = retain_tokens
+        self.compact_bytes = compact_bytes
+        self.model = model
+
+    def exists(self):
+        return self.path.exists()
+
+    def load_tail(self, max_tokens, model=None):
+        """
+        The newest non-system messages that fit in max_tokens, oldest first.
+        Only the end of the file that holds them is read.
+        """
+        model = model or self.model
+        messages = []
+        used = 0
+        # A line's length bounds its message's tokens, so the encoder is only
+        # needed once the lines read so far might no longer fit.
+        exact = False
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return messages
+        with f:
+            for line in lines_from_end(f):
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if not isinstance(message, dict) or message.get("role") == "system" or message.get("partial"):
+                    continue
+                if not exact:
+                    if used + len(line) <= max_tokens:
+                        messages.append(message)
+                        used += len(line)
+                        continue
+                    exact = True
+                    used = sum(count_message_tokens(m, model) for m in messages)
+                cost = count_message_tokens(message, model)
+                if used + cost > max_tokens:
+                    break
+                messages.append(message)
+                used += cost
+        messages.reverse()
+        return messages
+
+    def append(self, messages):
+        """Durably add messages to the end of the journal."""
+        data = b"".join(json.dumps(message).encode() + b"\n" for message in messages)
+        if not data:
+            return
+        created = not self.path.exists()
+        with open(self.path, "ab") as f:
+            self._trim_torn_line(f)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if created:
+            fsync_directory(self.path.parent)
+        if size > self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the journal down to the messages load_tail() could still return."""
+        messages = self.load_tail(self.retain_tokens)
+        partial = self.pending_partial()
+        if partial is not None:
+            messages.append({"partial": True, "content": partial})
+        self.rewrite(messages)
+
+    def open_partial(self):
+        """A writer for the chunks of an answer that is still streaming."""
+        return PartialWriter(self.path)
+
+    def pending_partial(self):
+        """Text of an interrupted answer at the end of the journal, or None."""
+        chunks = []
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            for line in lines_from_end(f):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or not record.get("partial"):
+                    break
+                chunks.append(record.get("content", ""))
+        if not chunks:
+            return None
+        return "".join(reversed(chunks))
+
+    def rewrite(self, messages):
+        """Atomically replace the journal's contents with `messages`."""
+        import tempfile
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for message in messages:
+                    f.write(json.dumps(message).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        fsync_directory(self.path.parent)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+    def migrate_from(self, legacy_path):
+        """
+        One-time import of an old whole-file JSON history. The old file is left
+        in place; it is only read while the journal does not exist yet.
+        """
+        legacy_path = Path(legacy_path)
+        if self.path.exists() or not legacy_path.exists():
+            return False
+        try:
+            with open(legacy_path, "r") as f:
+                messages = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return False
+        self.rewrite([m for m in messages if isinstance(m, dict) and m.get("role") != "system"])
+        return True
+
+    @staticmethod
+    def _trim_torn_line(f):
+        # An append cut short leaves a last line without its newline; drop it
+        # so the next record does not get glued onto it.
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        with open(f.name, "rb") as reader:
+            reader.seek(end - 1)
+            if reader.read(1) == b"\n":
+                return
+            position = end
+            while position > 0:
+                size = min(BLOCK_SIZE, position)
+                position -= size
+                reader.seek(position)
+                newline = reader.read(size).rfind(b"\n")
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    return
+        f.truncate(0)
+
+
+class PartialWriter:
+    """
+    Appends streamed chunks as partial records. Each is written through to the
+    OS, so it survives the process dying; the fsync comes with the complete
+    message that supersedes them.
+    """
+
+    def __init__(self, path):
+        self.f = open(path, "ab")
+        Journal._trim_torn_line(self.f)
+
+    def write(self, text):
+        self.f.write(json.dumps({"partial": True, "content": text}).encode() + b"\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
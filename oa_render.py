@@ -0,0 +1,171 @@
+"""
+Streaming output for oa-cli.py.
+
+StreamRenderer takes the text deltas of a streamed answer and keeps them in a
+list, joined once at the end, rather than growing a string token by token.
+Output goes through a background writer thread, so the loop reading the
+response never waits on the terminal. The thread writes whatever has arrived
+every `interval` seconds, or as soon as `max_chars` are pending: a handful of
+writes and flushes per second rather than one per token.
+
+With markdown=True (needs `pip install rich`) the answer is rendered as
+markdown while it streams. Finished blocks are printed once and only the block
+still being written is redrawn, so each redraw costs the same however long
+the answer gets.
+
+`on_batch`, if given, is called on the writer thread with each batch before it
+is shown, e.g. to persist the answer as it arrives.
+"""
+import sys
+import threading
+from collections import deque
+
+
+class StreamRenderer:
+    def __init__(self, out=None, interval=None, max_chars=2048, markdown=False, on_batch=None):
+        self.out = out or sys.stdout
+        self.on_batch = on_batch
+        # A markdown redraw re-renders the open block, so it refreshes less often.
+        self.interval = interval if interval is not None else (0.1 if markdown else 0.03)
+        self.max_chars = max_chars
+        self.parts = []
+        self.writes = 0
+        # write() only appends and checks an Event, so a token costs no lock.
+        self._queue = deque()
+        self._queued_chars = 0
+        self._ready = threading.Event()  # something is queued
+        self._hurry = threading.Event()  # a full batch is queued, or closing
+        self._closed = False
+        self._markdown = _MarkdownView(self.out) if markdown else None
+        self._thread = threading.Thread(target=self._run, name="stream-renderer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, text):
+        if not text:
+            return
+        self.parts.append(text)
+        self._queue.append(text)
+        self._queued_chars += len(text)
+        if not self._ready.is_set():
+            self._ready.set()
+        elif self._queued_chars >= self.max_chars and not self._hurry.is_set():
+            self._hurry.set()
+
+    def text(self):
+        return "".join(self.parts)
+
+    def close(self):
+        """Write out anything pending, stop the writer and return the full text."""
+        if not self._closed:
+            self._closed = True
+            self._hurry.set()
+            self._ready.set()
+        self._thread.join()
+        return self.text()
+
+    def _run(self):
+        while True:
+            # Sleep until something arrives, then give the batch `interval`
+            # seconds to fill up.
+            self._ready.wait()
+            self._hurry.wait(self.interval)
+            self._ready.clear()
+            if not self._closed:
+                self._hurry.clear()
+            self._queued_chars = 0
+            pending = []
+            while self._queue:
+                pending.append(self._queue.popleft())
+            if pending:
+                self._emit("".join(pending))
+            if self._closed and not self._queue:
+                if self._markdown is not None:
+                    self._markdown.finish()
+                return
+
+    def _emit(self, chunk):
+        self.writes += 1
+        if self.on_batch is not None:
+            self.on_batch(chunk)
+        if self._markdown is not None:
+            self._markdown.feed(chunk)
+            return
+        self.out.write(chunk)
+        self.out.flush()
+
+
+class _MarkdownView:
+    """Incremental markdown on a rich Live display; plain text if rich is missing."""
+
+    def __init__(self, out):
+        self.out = out
+        self.tail = ""
+        self.live = None
+        try:
+            from rich.console import Console
+            from rich.live import Live
+            from rich.markdown import Markdown
+        except ImportError:
+            return
+        self.Markdown = Markdown
+        self.Live = Live
+        self.console = Console(file=out)
+        self.live = self._start_live()
+
+    def _start_live(self):
+        live = self.Live(console=self.console, auto_refresh=False, vertical_overflow="visible")
+        live.start()
+        return live
+
+    def feed(self, chunk):
+        if self.live is None:
+            self.out.write(chunk)
+            self.out.flush()
+            return
+        self.tail += chunk
+        done, self.tail = split_finished_blocks(self.tail)
+        if done:
+            # Settle the finished blocks above the live area; they are never redrawn.
+            self.live.update(self.Markdown(done), refresh=True)
+            self.live.stop()
+            self.live = self._start_live()
+        self.live.update(self.Markdown(self.tail), refresh=True)
+
+    def finish(self):
+        if self.live is not None:
+            self.live.update(self.Markdown(self.tail), refresh=True)
+            self.live.stop()
+
+
+def split_finished_blocks(text):
+    """
+    Split text at its last blank line outside a code fence: everything before
+    it is complete markdown that later text cannot change.
+    """
+    cut = 0
+    in_fence = False
+    position = 0
+    for line in text.splitlines(keepends=True):
+        position += len(line)
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and not line.strip() and line.endswith("\n"):
+            cut = position
+    return text[:cut], text[cut:]
+
+
+def render_stream(deltas, **options):
+    """Render an iterable of text deltas and return the full text."""
+    renderer = StreamRenderer(**options)
+    try:
+        for text in deltas:
+            renderer.write(text)
+    finally:
+        text = renderer.close()
+    return text
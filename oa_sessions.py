@@ -0,0 +1,112 @@
+"""
+Named conversation sessions for oa-cli.py.
+
+Each session has its own journal file (see oa_journal.py). A small SQLite
+index maps session names to their files and keeps the counts and timestamps
+that `--list-sessions` shows, so starting a session costs one indexed lookup
+and a read of that session's journal only, however many sessions exist.
+"""
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from pathlib import Path
+
+DEFAULT_SESSION = "default"
+
+
+def new_journal_name():
+    return f"{os.urandom(16).hex()}.jsonl"
+
+
+SessionInfo = namedtuple("SessionInfo", ["name", "messages", "created", "updated", "parent"])
+
+
+class SessionIndex:
+    def __init__(self, root, default_journal=None):
+        self.root = Path(root)
+        self.journals = self.root / "journals"
+        self.journals.mkdir(parents=True, exist_ok=True)
+        # The default session keeps the journal oa-cli used before sessions existed.
+        self.default_journal = Path(default_journal) if default_journal else None
+        self._db = sqlite3.connect(self.root / "sessions.db", isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "name TEXT PRIMARY KEY, journal TEXT NOT NULL, messages INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, updated REAL NOT NULL, parent TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def close(self):
+        self._db.close()
+
+    def journal_path(self, name, create=True):
+        """The journal file for session `name`, registering the session if new."""
+        if name == DEFAULT_SESSION and self.default_journal is not None:
+            if create:
+                self._register(name, self.default_journal)
+            return self.default_journal
+        row = self._db.execute("SELECT journal FROM sessions WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            return Path(row[0])
+        if not create:
+            return None
+        # File names are ids, so session names can be any text.
+        return self._register(name, self.journals / new_journal_name())
+
+    def _register(self, name, journal, messages=0, parent=None):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR IGNORE INTO sessions (name, journal, messages, created, updated, parent) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, str(journal), messages, now, now, parent),
+        )
+        return journal
+
+    def exists(self, name):
+        return self._db.execute("SELECT 1 FROM sessions WHERE name = ?", (name,)).fetchone() is not None
+
+    def touch(self, name, added=0):
+        """Record that `added` messages were appended to the session just now."""
+        self._db.execute(
+            "UPDATE sessions SET messages = messages + ?, updated = ? WHERE name = ?",
+            (added, time.time(), name),
+        )
+
+    def reset(self, name):
+        self._db.execute("UPDATE sessions SET messages = 0, updated = ? WHERE name = ?", (time.time(), name))
+
+    def list(self, limit=None):
+        """Sessions, most recently used first."""
+        query = "SELECT name, messages, created, updated, parent FROM sessions ORDER BY updated DESC"
+        if limit is not None:
+            return [SessionInfo(*row) for row in self._db.execute(query + " LIMIT ?", (limit,))]
+        return [SessionInfo(*row) for row in self._db.execute(query)]
+
+    def latest(self):
+        row = self._db.execute("SELECT name FROM sessions ORDER BY updated DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def fork(self, source, target):
+        """Start session `target` as a copy of session `source`."""
+        import shutil
+
+        if self.exists(target):
+            raise ValueError(f"Session '{target}' already exists")
+        source_path = self.journal_path(source, create=False)
+        if source_path is None:
+            raise ValueError(f"No session named '{source}'")
+        target_path = self.journals / new_journal_name()
+        if source_path.exists():
+            shutil.copyfile(source_path, target_path)
+        row = self._db.execute("SELECT messages FROM sessions WHERE name = ?", (source,)).fetchone()
+        self._register(target, target_path, messages=row[0] if row else 0, parent=source)
+        return target_path
+
+    def delete(self, name):
+        path = self.journal_path(name, create=False)
+        self._db.execute("DELETE FROM sessions WHERE name = ?", (name,))
+        if path is not None and path.exists():
+            os.unlink(path)
+        return path is not None
@@ -1,9 +1,19 @@
 import os
+import io
 import json
+import random
+import re
+import time
+from collections import namedtuple
+
 import wikipedia
 from dotenv import load_dotenv
+import openai
 from openai import OpenAI
 
+import transport
+from token_utils import DEFAULT_MODEL, count_text_tokens
+
 # Load your OpenAI API key from an .env file or environment variable
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -146,6 +156,79 @@ translation_tools = [
     }
 ]
 
+# One call for all three: the sentiment, entities and translation schemas as
+# sections of one object. No section is required, so a response that leaves
+# one out still parses.
+analysis_tools = [
+    {
+        "type": "function",
+        "function": {
+            "name": "print_message_analysis",
+            "description": "Prints the sentiment scores, named entities and translation of a message.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sentiment": sentiment_tools[0]["function"]["parameters"],
+                    "entities": entities_tools[0]["function"]["parameters"]["properties"]["entities"],
+                    "translated_text": translation_tools[0]["function"]["parameters"]["properties"]["translated_text"]
+                }
+            }
+        }
+    }
+]
+
+# The last step of a chunked classification: the article's overall subject and
+# summary, written from the summaries of its sections.
+article_summary_tools = [
+    {
+        "type": "function",
+        "function": {
+            "name": "print_article_summary",
+            "description": "Prints the overall subject and summary of an article.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    key: classification_tools[0]["function"]["parameters"]["properties"][key]
+                    for key in ("subject", "summary")
+                },
+                "required": ["subject", "summary"]
+            }
+        }
+    }
+]
+
+# Many short documents per call: one set of sentiment scores per document,
+# keyed by the id the document was sent with.
+packed_sentiment_tools = [
+    {
+        "type": "function",
+        "function": {
+            "name": "print_sentiment_scores_batch",
+            "description": "Prints the sentiment scores of each of the given documents.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "scores": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {
+                                    "type": "string",
+                                    "description": "The id of the document these scores are for."
+                                },
+                                **sentiment_tools[0]["function"]["parameters"]["properties"]
+                            },
+                            "required": ["id", *sentiment_tools[0]["function"]["parameters"]["required"]]
+                        }
+                    }
+                },
+                "required": ["scores"]
+            }
+        }
+    }
+]
+
 # ------------------------------------------------------------------
 # Helper: Extract function call result from the API response
 # ------------------------------------------------------------------
@@ -165,14 +248,27 @@ def extract_function_result(response, function_name):
                     print("Error parsing function result:", e)
     return None
 
+def parse_function_result(response, function_name):
+    """
+    extract_function_result() without the printing, for callers that report
+    errors themselves: raises ValueError saying whether the call was missing
+    or its arguments were not valid JSON.
+    """
+    message = response.choices[0].message
+    error = ValueError(f"No {function_name} call in the response")
+    for tool_call in message.tool_calls or []:
+        if tool_call.function.name == function_name:
+            try:
+                return json.loads(tool_call.function.arguments)
+            except ValueError as e:
+                error = ValueError(f"Malformed {function_name} arguments: {e}")
+    raise error
+
 # ------------------------------------------------------------------
 # Sentiment Analysis Functions using GPT-4o
 # ------------------------------------------------------------------
 
-def analyze_sentiment(content):
-    """
-    Analyzes the sentiment of the given text using OpenAI's GPT-4 function calling.
-    """
+def sentiment_request(content):
     query = f"""
     <text>
     {content}
@@ -180,14 +276,19 @@ def analyze_sentiment(content):
 
     Only use the print_sentiment_scores function.
     """
-    messages = [{"role": "user", "content": query}]
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o",
-        messages=messages,
+        messages=[{"role": "user", "content": query}],
         tools=sentiment_tools,
         tool_choice={"type": "function", "function": {"name": "print_sentiment_scores"}},
         max_tokens=4096
     )
+
+def analyze_sentiment(content):
+    """
+    Analyzes the sentiment of the given text using OpenAI's GPT-4 function calling.
+    """
+    response = client.chat.completions.create(**sentiment_request(content))
     result = extract_function_result(response, "print_sentiment_scores")
     if result:
         print("Sentiment Analysis (JSON):")
@@ -199,10 +300,7 @@ def analyze_sentiment(content):
 # Entity Extraction Function using GPT-4
 # ------------------------------------------------------------------
 
-def extract_entities(text):
-    """
-    Extracts named entities from the given text using OpenAI's GPT-4 function calling.
-    """
+def entities_request(text):
     query = f"""
     <document>
     {text}
@@ -210,14 +308,19 @@ def extract_entities(text):
 
     Use the print_entities function.
     """
-    messages = [{"role": "user", "content": query}]
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o",
-        messages=messages,
+        messages=[{"role": "user", "content": query}],
         tools=entities_tools,
         tool_choice={"type": "function", "function": {"name": "print_entities"}},
         max_tokens=4096
     )
+
+def extract_entities(text):
+    """
+    Extracts named entities from the given text using OpenAI's GPT-4 function calling.
+    """
+    response = client.chat.completions.create(**entities_request(text))
     result = extract_function_result(response, "print_entities")
     if result:
         print("Extracted Entities (JSON):")
@@ -229,31 +332,36 @@ def extract_entities(text):
 # Article Classification Function using Wikipedia content and GPT-4
 # ------------------------------------------------------------------
 
-def generate_json_for_article(subject):
-    """
-    Retrieves a Wikipedia article for the subject and classifies its content using GPT-4 function calling.
-    """
-    try:
-        page = wikipedia.page(subject, auto_suggest=True)
-    except Exception as e:
-        print(f"Error retrieving Wikipedia page for {subject}: {e}")
-        return
+def fetch_article(subject):
+    return wikipedia.page(subject, auto_suggest=True).content
 
+def classification_request(document):
     query = f"""
     <document>
-    {page.content}
+    {document}
     </document>
 
     Use the print_article_classification function. Example categories are Politics, Sports, Technology, Entertainment, Business.
     """
-    messages = [{"role": "user", "content": query}]
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o",
-        messages=messages,
+        messages=[{"role": "user", "content": query}],
         tools=classification_tools,
         tool_choice={"type": "function", "function": {"name": "print_article_classification"}},
         max_tokens=4096
     )
+
+def generate_json_for_article(subject):
+    """
+    Retrieves a Wikipedia article for the subject and classifies its content using GPT-4 function calling.
+    """
+    try:
+        document = fetch_article(subject)
+    except Exception as e:
+        print(f"Error retrieving Wikipedia page for {subject}: {e}")
+        return
+
+    response = client.chat.completions.create(**classification_request(document))
     result = extract_function_result(response, "print_article_classification")
     if result:
         print("Text Classification (JSON):")
@@ -265,20 +373,22 @@ def generate_json_for_article(subject):
 # Translation Function using GPT-4o
 # ------------------------------------------------------------------
 
-def translate(text, target_language=TARGET_LANG):
-    """
-    Translates the given text to the target language using GPT-4 function calling.
-    Default target language is Spanish.
-    """
+def translation_request(text, target_language=TARGET_LANG):
     query = f"Translate the following text to {target_language}: \"{text}\". Return only the translated text in the translate_text function."
-    messages = [{"role": "user", "content": query}]
-    response = client.chat.completions.create(
+    return dict(
         model="gpt-4o",
-        messages=messages,
+        messages=[{"role": "user", "content": query}],
         tools=translation_tools,
         tool_choice={"type": "function", "function": {"name": "translate_text"}},
         max_tokens=4096
     )
+
+def translate(text, target_language=TARGET_LANG):
+    """
+    Translates the given text to the target language using GPT-4 function calling.
+    Default target language is Spanish.
+    """
+    response = client.chat.completions.create(**translation_request(text, target_language))
     result = extract_function_result(response, "translate_text")
     if result:
         print("Translation (JSON):")
@@ -286,6 +396,508 @@ def translate(text, target_language=TARGET_LANG):
     else:
         print("No translation found in the response.")
 
+# ------------------------------------------------------------------
+# Combined analysis: sentiment, entities and translation in one call
+# ------------------------------------------------------------------
+
+def analysis_request(content, target_language=TARGET_LANG):
+    query = f"""
+    <text>
+    {content}
+    </text>
+
+    Use the print_message_analysis function: score the sentiment of the text, extract its named entities, and translate it to {target_language}.
+    """
+    return dict(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": query}],
+        tools=analysis_tools,
+        tool_choice={"type": "function", "function": {"name": "print_message_analysis"}},
+        max_tokens=4096
+    )
+
+def split_analysis(result):
+    """
+    Turns a print_message_analysis result into {"sentiment", "entities",
+    "translation"}, with None for any section that is missing or malformed.
+    """
+    result = result if isinstance(result, dict) else {}
+    sentiment = result.get("sentiment")
+    scores = ("positive_score", "negative_score", "neutral_score")
+    if not (isinstance(sentiment, dict) and all(isinstance(sentiment.get(key), (int, float)) for key in scores)):
+        sentiment = None
+    entities = result.get("entities")
+    if isinstance(entities, list):
+        entities = [entity for entity in entities if isinstance(entity, dict) and entity.get("name")]
+    else:
+        entities = None
+    translation = result.get("translated_text")
+    if not isinstance(translation, str):
+        translation = None
+    return {"sentiment": sentiment, "entities": entities, "translation": translation}
+
+def analyze_message(content, target_language=TARGET_LANG):
+    """
+    Scores the sentiment of the text, extracts its entities and translates it,
+    in a single GPT-4o function call.
+    """
+    response = client.chat.completions.create(**analysis_request(content, target_language))
+    result = extract_function_result(response, "print_message_analysis")
+    if result is None:
+        print("No message analysis found in the response.")
+        return
+    analysis = split_analysis(result)
+    print("Message Analysis (JSON):")
+    print(json.dumps(analysis, indent=2, ensure_ascii=False))
+    missing = [section for section, value in analysis.items() if value is None]
+    if missing:
+        print(f"Missing from the response: {', '.join(missing)}")
+
+# ------------------------------------------------------------------
+# Batch variants: many inputs, concurrently, with structured results
+# ------------------------------------------------------------------
+#
+# Each takes an iterable of inputs and returns one BatchResult per input, in
+# input order, instead of printing. A fixed pool of `concurrency` workers
+# shares one pooled AsyncOpenAI client and reads the inputs as it goes, so a
+# large iterable is never turned into that many tasks at once.
+#
+# Rate limits (429), timeouts, connection errors and 5xx responses are
+# retried up to `max_retries` times with jittered exponential backoff, or
+# after the server's Retry-After when it sends one. A rate limit pauses the
+# whole pool, not just the worker that hit it, since the others are about to
+# hit it too. Other errors, and inputs that still fail, end up in `error`.
+
+BatchResult = namedtuple("BatchResult", ["index", "input", "result", "error", "attempts", "seconds"])
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                    openai.InternalServerError)
+
+class Backoff:
+    """
+    Retry delays and the in-flight limit shared by a batch's workers. A rate
+    limit pauses every worker for the server's Retry-After and halves how many
+    requests may be in flight; each success lets the limit creep back up.
+    """
+
+    def __init__(self, base=0.5, cap=30.0):
+        self.base = base
+        self.cap = cap
+        self.resume_at = 0.0
+        self.sent = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.limit = self.max_limit = None
+        self.in_flight = 0
+        self.cut_at = 0.0
+        self._slots = None
+
+    def start(self, concurrency):
+        import asyncio
+
+        self.limit = self.max_limit = float(concurrency)
+        self._slots = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait out any pause and for a free slot; returns when the request went out."""
+        import asyncio
+
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.sent += 1
+        return time.monotonic()
+
+    async def release(self, ok):
+        async with self._slots:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._slots.notify_all()
+
+    def failed(self, error, attempt, sent_at=0.0):
+        """Schedule the retry after `error` on the given attempt and return the delay."""
+        self.retries += 1
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.cap, self.base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if isinstance(error, openai.RateLimitError):
+            self.rate_limited += 1
+            now = time.monotonic()
+            # Requests sent before the last cut were sent at the old limit; only cut once for them.
+            if self.limit is not None and sent_at >= self.cut_at:
+                self.limit = max(1.0, self.limit / 2)
+                self.cut_at = now
+            self.resume_at = max(self.resume_at, now + delay)
+        return delay
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+async def run_batch(inputs, make_request, function_name, concurrency=16, max_retries=6, prepare=None, backoff=None):
+    """
+    Run one forced tool call per input and return BatchResults in input order.
+    `make_request(item)` builds the chat.completions.create() arguments;
+    `prepare(item)`, if given, is awaited first to turn the input into what
+    make_request takes.
+    """
+    import asyncio
+
+    # A client of its own, closed on the way out: connections belong to the
+    # event loop that opened them, and each asyncio.run() is a new loop.
+    client = transport.new_async_openai_client().with_options(max_retries=0)
+    backoff = backoff or Backoff()
+    backoff.start(max(1, concurrency))
+    items = enumerate(inputs)
+    results = {}
+
+    async def run_one(index, item):
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            request = make_request(await prepare(item) if prepare else item)
+        except Exception as e:
+            return BatchResult(index, item, None, f"{type(e).__name__}: {e}", attempt, time.perf_counter() - started)
+        while True:
+            sent_at = await backoff.acquire()
+            attempt += 1
+            try:
+                response = await client.chat.completions.create(**request)
+            except RETRYABLE_ERRORS as e:
+                await backoff.release(False)
+                if attempt > max_retries:
+                    error = f"{type(e).__name__}: {e} (gave up after {attempt} attempts)"
+                    return BatchResult(index, item, None, error, attempt, time.perf_counter() - started)
+                await asyncio.sleep(backoff.failed(e, attempt - 1, sent_at))
+                continue
+            except openai.OpenAIError as e:
+                await backoff.release(False)
+                return BatchResult(index, item, None, f"{type(e).__name__}: {e}", attempt, time.perf_counter() - started)
+            await backoff.release(True)
+            try:
+                result, error = parse_function_result(response, function_name), None
+            except ValueError as e:
+                result, error = None, str(e)
+            return BatchResult(index, item, result, error, attempt, time.perf_counter() - started)
+
+    async def worker():
+        for index, item in items:
+            results[index] = await run_one(index, item)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        await client.close()
+    return [results[index] for index in sorted(results)]
+
+async def analyze_sentiment_batch(contents, **options):
+    return await run_batch(contents, sentiment_request, "print_sentiment_scores", **options)
+
+async def extract_entities_batch(texts, **options):
+    return await run_batch(texts, entities_request, "print_entities", **options)
+
+async def generate_json_for_articles_batch(subjects, **options):
+    import asyncio
+
+    async def fetch(subject):
+        # The wikipedia client blocks, so pages are fetched on worker threads.
+        return await asyncio.to_thread(fetch_article, subject)
+
+    return await run_batch(subjects, classification_request, "print_article_classification", prepare=fetch, **options)
+
+async def translate_batch(texts, target_language=TARGET_LANG, **options):
+    return await run_batch(texts, lambda text: translation_request(text, target_language), "translate_text", **options)
+
+async def analyze_message_batch(contents, target_language=TARGET_LANG, **options):
+    results = await run_batch(contents, lambda content: analysis_request(content, target_language),
+                              "print_message_analysis", **options)
+    return [result if result.result is None else result._replace(result=split_analysis(result.result))
+            for result in results]
+
+# ------------------------------------------------------------------
+# Packed sentiment scoring: many short documents per call
+# ------------------------------------------------------------------
+#
+# A tweet-sized text is a small fraction of a request: the instructions and
+# the tool schema are sent every time, and each call pays the model's fixed
+# latency. Packing sends up to `pack_size` documents (and at most
+# `pack_chars` characters) in one call as <doc id="..."> blocks and asks for
+# an array of scores back. Entries are matched to documents by id; any
+# document whose entry is missing, unknown, duplicated or malformed is
+# scored again on its own with sentiment_request().
+
+SENTIMENT_SCORES = ("positive_score", "negative_score", "neutral_score")
+
+def packed_sentiment_request(documents):
+    """`documents` is a list of (id, text) pairs."""
+    blocks = "\n".join(f'<doc id="{doc_id}">\n{text}\n</doc>' for doc_id, text in documents)
+    query = f"""
+    {blocks}
+
+    Score the sentiment of each document above on its own. Use the print_sentiment_scores_batch function with exactly one entry per document, giving the document's id.
+    """
+    return dict(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": query}],
+        tools=packed_sentiment_tools,
+        tool_choice={"type": "function", "function": {"name": "print_sentiment_scores_batch"}},
+        max_tokens=4096
+    )
+
+def unpack_sentiment_scores(result, ids):
+    """Map id -> scores for the well-formed entries of a packed result; ids not in `ids` are dropped."""
+    scores = {}
+    entries = result.get("scores") if isinstance(result, dict) else None
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or entry.get("id") not in ids or entry["id"] in scores:
+            continue
+        values = [entry.get(key) for key in SENTIMENT_SCORES]
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 1
+               for value in values):
+            scores[entry["id"]] = dict(zip(SENTIMENT_SCORES, values))
+    return scores
+
+def pack_documents(contents, pack_size, pack_chars):
+    """Yield lists of (index, text), each within pack_size documents and pack_chars characters."""
+    pack, chars = [], 0
+    for index, text in enumerate(contents):
+        if pack and (len(pack) >= pack_size or chars + len(text) > pack_chars):
+            yield pack
+            pack, chars = [], 0
+        pack.append((index, text))
+        chars += len(text)
+    if pack:
+        yield pack
+
+async def analyze_sentiment_packed(contents, pack_size=20, pack_chars=8000, **options):
+    """
+    Like analyze_sentiment_batch(), but with up to `pack_size` documents per
+    call. Returns one BatchResult per document, in input order; `attempts`
+    and `seconds` are those of the call the document was scored in.
+    """
+    packs = await run_batch(
+        pack_documents(contents, pack_size, pack_chars),
+        lambda pack: packed_sentiment_request([(str(index), text) for index, text in pack]),
+        "print_sentiment_scores_batch",
+        **options,
+    )
+    results = {}
+    retry = []
+    for packed in packs:
+        scores = unpack_sentiment_scores(packed.result, {str(index) for index, _ in packed.input})
+        for index, text in packed.input:
+            if str(index) in scores:
+                results[index] = BatchResult(index, text, scores[str(index)], None, packed.attempts, packed.seconds)
+            else:
+                retry.append((index, text))
+    if retry:
+        singles = await run_batch([text for _, text in retry], sentiment_request, "print_sentiment_scores", **options)
+        for (index, _), single in zip(retry, singles):
+            results[index] = single._replace(index=index)
+    return [results[index] for index in sorted(results)]
+
+# ------------------------------------------------------------------
+# Chunked article classification: map over sections, reduce in Python
+# ------------------------------------------------------------------
+#
+# generate_json_for_article() sends the whole page in one prompt, so a long
+# article is slow, costly, and can overflow the context window. Here the
+# article is cut into sections of at most `max_chunk_tokens` tokens, read
+# lazily from the text, and the sections are classified concurrently on the
+# batch pool. Keywords and category scores are merged in Python, weighted by
+# section length, and one short last call writes the subject and summary from
+# the sections' summaries. Latency then follows the longest section rather
+# than the whole article.
+
+CHUNK_TOKENS = 2000
+HEADING = re.compile(r"^=+ .* =+$")
+
+def article_paragraphs(lines):
+    """Yield an article's paragraphs and section headings, one at a time."""
+    paragraph = []
+    for line in lines:
+        line = line.strip()
+        if line and not HEADING.match(line):
+            paragraph.append(line)
+            continue
+        if paragraph:
+            yield " ".join(paragraph)
+            paragraph = []
+        if line:
+            yield line
+    if paragraph:
+        yield " ".join(paragraph)
+
+def fit_pieces(paragraph, max_tokens, model=DEFAULT_MODEL):
+    """Split a paragraph longer than max_tokens at sentences, and a sentence that is still too long at words."""
+    if count_text_tokens(paragraph, model) <= max_tokens:
+        yield paragraph
+        return
+    for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+        if count_text_tokens(sentence, model) <= max_tokens:
+            yield sentence
+            continue
+        words, size = [], 0
+        for word in sentence.split():
+            tokens = count_text_tokens(" " + word, model)
+            if words and size + tokens > max_tokens:
+                yield " ".join(words)
+                words, size = [], 0
+            words.append(word)
+            size += tokens
+        if words:
+            yield " ".join(words)
+
+def chunk_article(document, max_tokens=CHUNK_TOKENS, model=DEFAULT_MODEL):
+    """
+    Yield sections of `document` (a string, or an iterable of lines such as a
+    file) of at most max_tokens tokens each. Sections end at paragraph
+    boundaries where they can, and at a heading once they are half full.
+    """
+    lines = io.StringIO(document) if isinstance(document, str) else document
+    chunk, size = [], 0
+    heading = None  # held back to go in with the paragraph after it
+    for paragraph in article_paragraphs(lines):
+        if HEADING.match(paragraph):
+            heading = paragraph
+            continue
+        budget = max_tokens - (count_text_tokens(heading, model) + 1 if heading else 0)
+        for piece in fit_pieces(paragraph, max(1, budget), model):
+            new_section = heading is not None
+            if heading:
+                piece, heading = f"{heading}\n\n{piece}", None
+            tokens = count_text_tokens(piece, model) + 1  # and the blank line joining it on
+            if chunk and (size + tokens > max_tokens or (new_section and size >= max_tokens // 2)):
+                yield "\n\n".join(chunk)
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += tokens
+    if chunk:
+        yield "\n\n".join(chunk)
+
+def chunk_classification_request(chunk):
+    query = f"""
+    <document>
+    {chunk}
+    </document>
+
+    This is one section of a longer article. Use the print_article_classification function on this section alone, with a summary of one or two sentences. Example categories are Politics, Sports, Technology, Entertainment, Business.
+    """
+    return dict(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": query}],
+        tools=classification_tools,
+        tool_choice={"type": "function", "function": {"name": "print_article_classification"}},
+        max_tokens=4096
+    )
+
+def merge_chunk_classifications(classified, max_keywords=20):
+    """
+    Merge (classification, weight) pairs, one per section, into the
+    article's keywords, categories and most likely subject. A keyword ranks
+    by the total weight of the sections naming it; a category's score is its
+    weighted mean over all sections, counting 0 where a section leaves it out.
+    """
+    total = sum(weight for _, weight in classified) or 1
+    keywords, categories, subjects = {}, {}, {}
+    for result, weight in classified:
+        names = {keyword.strip().lower(): keyword.strip() for keyword in result.get("keywords") or []
+                 if isinstance(keyword, str) and keyword.strip()}
+        for key, name in names.items():
+            keywords.setdefault(key, [name, 0])[1] += weight
+        for category in result.get("categories") or []:
+            if not isinstance(category, dict) or not isinstance(category.get("name"), str):
+                continue
+            score = category.get("score")
+            if isinstance(score, (int, float)) and not isinstance(score, bool):
+                name = category["name"].strip()
+                categories.setdefault(name.lower(), [name, 0.0])[1] += min(max(score, 0.0), 1.0) * weight
+        subject = result.get("subject")
+        if isinstance(subject, str) and subject.strip():
+            subjects[subject.strip()] = subjects.get(subject.strip(), 0) + weight
+    # sorted() is stable, so ties keep the order the sections came in.
+    ranked = sorted(keywords.values(), key=lambda entry: -entry[1])
+    return {
+        "subject": max(subjects, key=subjects.get) if subjects else None,
+        "keywords": [name for name, _ in ranked[:max_keywords]],
+        "categories": sorted(({"name": name, "score": round(score / total, 3)} for name, score in categories.values()),
+                             key=lambda category: -category["score"]),
+    }
+
+def article_summary_request(summaries, merged):
+    sections = "\n".join(f"- {summary}" for summary in summaries)
+    query = f"""
+    <sections>
+    {sections}
+    </sections>
+
+    These summarise the sections of one article, in order. Its keywords are: {", ".join(merged["keywords"])}.
+    Use the print_article_summary function to give the article's overall subject and a one paragraph summary.
+    """
+    return dict(
+        model="gpt-4o",
+        messages=[{"role": "user", "content": query}],
+        tools=article_summary_tools,
+        tool_choice={"type": "function", "function": {"name": "print_article_summary"}},
+        max_tokens=1024
+    )
+
+async def classify_article_chunked(document, max_chunk_tokens=CHUNK_TOKENS, max_keywords=20, **options):
+    """
+    Classify a long article section by section. Returns the same fields as
+    print_article_classification plus "chunks" and "failed_chunks", or None
+    when no section could be classified.
+    """
+    sections = await run_batch(chunk_article(document, max_chunk_tokens), chunk_classification_request,
+                               "print_article_classification", **options)
+    classified = [(section.result, count_text_tokens(section.input)) for section in sections
+                  if isinstance(section.result, dict)]
+    if not classified:
+        return None
+    merged = merge_chunk_classifications(classified, max_keywords)
+    summaries = [result["summary"] for result, _ in classified if isinstance(result.get("summary"), str)]
+    [final] = await run_batch([summaries], lambda summaries: article_summary_request(summaries, merged),
+                              "print_article_summary", **options)
+    # Without the last call, the first sections' summaries and the most common subject stand in.
+    final = final.result if isinstance(final.result, dict) else {}
+    return {
+        "subject": final.get("subject") or merged["subject"],
+        "summary": final.get("summary") or " ".join(summaries[:2]),
+        "keywords": merged["keywords"],
+        "categories": merged["categories"],
+        "chunks": len(sections),
+        "failed_chunks": len(sections) - len(classified),
+    }
+
+def generate_json_for_article_chunked(subject, max_chunk_tokens=CHUNK_TOKENS):
+    """
+    Like generate_json_for_article(), but classifies a long article in
+    sections of at most max_chunk_tokens tokens.
+    """
+    import asyncio
+
+    try:
+        document = fetch_article(subject)
+    except Exception as e:
+        print(f"Error retrieving Wikipedia page for {subject}: {e}")
+        return
+
+    result = asyncio.run(classify_article_chunked(document, max_chunk_tokens))
+    if result:
+        print("Text Classification (JSON):")
+        print(json.dumps(result, indent=2))
+    else:
+        print("No text classification found in the response.")
+
 # Example usage
 if __name__ == "__main__":
     # Example sentiment analysis calls:
@@ -312,7 +924,13 @@ if __name__ == "__main__":
     generate_json_for_article("Octopus")
     print("\nClassifying article for 'Herbert Hoover':")
     generate_json_for_article("Herbert Hoover")
+    print("\nClassifying article for 'World War II' section by section:")
+    generate_json_for_article_chunked("World War II")
 
     # Example translation call:
     print("\nTranslating text:")
     translate("how much does this cost")
+
+    # Example combined analysis: sentiment, entities and translation in one call:
+    print("\nAnalyzing a customer message in one call:")
+    analyze_message("The driver from Chaldal was lovely, but my order from the Gulshan store arrived an hour late.")
@@ -0,0 +1,175 @@
+"""
+Bounded conversation stores for the bank bot.
+
+A store maps a user id to that user's message list. `load()` returns the
+messages (or None for a new user) and `save()` puts them back after the turn.
+
+- MemorySessionStore keeps sessions in RAM with LRU eviction, an idle TTL and a
+  per-session byte cap, and reports its memory use through `stats()`.
+- SqliteSessionStore keeps the same bounded hot set in RAM but pages evicted
+  sessions out to an SQLite file, and back in on the user's next message.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def to_plain(message):
+    """Turn an SDK message object into the plain dict the API accepts back."""
+    if hasattr(message, "model_dump"):
+        return message.model_dump(exclude_none=True)
+    return message
+
+
+def trim_to_bytes(messages, max_bytes):
+    """
+    Drop the oldest non-system messages until the session fits in max_bytes,
+    and return its size. Tool results whose assistant tool-call message was
+    dropped go with it, since the API rejects a tool message without its call.
+    """
+    sizes = [len(json.dumps(message)) + 2 for message in messages]
+    size = sum(sizes)
+    start = 1 if messages and messages[0].get("role") == "system" else 0
+    drop = start
+    # Always keep the newest message, whatever its size.
+    while size > max_bytes and drop < len(messages) - 1:
+        size -= sizes[drop]
+        drop += 1
+        while drop < len(messages) - 1 and messages[drop].get("role") == "tool":
+            size -= sizes[drop]
+            drop += 1
+    del messages[start:drop]
+    return size
+
+
+class MemorySessionStore:
+    def __init__(self, max_sessions=5000, ttl_seconds=1800, max_session_bytes=64 * 1024):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_session_bytes = max_session_bytes
+        # user id -> [messages, size in bytes, last access time], oldest access first
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def load(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+            entry[2] = time.monotonic()
+            self._sessions.move_to_end(key)
+            return entry[0]
+
+    def save(self, user_id, messages):
+        key = str(user_id)
+        messages[:] = [to_plain(message) for message in messages]
+        self._put(key, messages, trim_to_bytes(messages, self.max_session_bytes))
+
+    def _put(self, key, messages, size):
+        with self._lock:
+            old = self._sessions.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._sessions[key] = [messages, size, time.monotonic()]
+            self._bytes += size
+            self._expire()
+            while len(self._sessions) > self.max_sessions:
+                old_key, old_entry = self._sessions.popitem(last=False)
+                self._bytes -= old_entry[1]
+                self.evictions += 1
+                self._evicted(old_key, old_entry[0])
+
+    def drop(self, user_id):
+        with self._lock:
+            entry = self._sessions.pop(str(user_id), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _expire(self):
+        # Entries are kept in access order, so the idle ones form a prefix.
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if entry[2] > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= entry[1]
+            self.expirations += 1
+            self._evicted(key, entry[0])
+
+    def _evicted(self, key, messages):
+        """Called with the lock held for every session leaving RAM."""
+
+
+class SqliteSessionStore(MemorySessionStore):
+    def __init__(self, path, max_sessions=1000, ttl_seconds=600, max_session_bytes=64 * 1024,
+                 disk_ttl_seconds=7 * 24 * 3600):
+        super().__init__(max_sessions, ttl_seconds, max_session_bytes)
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self.paged_out = 0
+        self.paged_in = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def load(self, user_id):
+        with self._lock:
+            messages = super().load(user_id)
+            if messages is not None:
+                return messages
+            key = str(user_id)
+            row = self._db.execute("SELECT messages FROM sessions WHERE user_id = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            # The session lives in RAM again until it is next evicted.
+            messages = json.loads(row[0])
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (key,))
+            self._put(key, messages, len(row[0]))
+            self.paged_in += 1
+            return messages
+
+    def drop(self, user_id):
+        with self._lock:
+            super().drop(user_id)
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (str(user_id),))
+
+    def purge(self):
+        """Delete paged-out sessions idle for longer than disk_ttl_seconds."""
+        with self._lock:
+            cutoff = time.time() - self.disk_ttl_seconds
+            return self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            stats = super().stats()
+            stats["paged_out"] = self.paged_out
+            stats["paged_in"] = self.paged_in
+            stats["on_disk"] = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return stats
+
+    def _evicted(self, key, messages):
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, messages, updated) VALUES (?, ?, ?)",
+            (key, json.dumps(messages), time.time()),
+        )
+        self.paged_out += 1
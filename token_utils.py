@@ -0,0 +1,137 @@
+"""
+Token counting shared by the scripts in this repo.
+
+The tiktoken encoder is resolved once per model and text counts are memoised,
+so counting the same history on every turn does not re-encode old messages.
+"""
+import json
+from functools import lru_cache
+
+DEFAULT_MODEL = "gpt-4o"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")  # Default encoding
+
+
+@lru_cache(maxsize=8192)
+def count_text_tokens(text, model=DEFAULT_MODEL):
+    return len(get_encoding(model).encode(text))
+
+
+def count_message_tokens(message, model=DEFAULT_MODEL):
+    """Tokens one chat message adds to a prompt, including its framing."""
+    if hasattr(message, "model_dump"):
+        message = message.model_dump(exclude_none=True)
+    # Every message follows <im_start>{role/name}\n{content}<im_end>\n
+    num_tokens = 4
+    for key, value in message.items():
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        num_tokens += count_text_tokens(value, model)
+        if key == "name":  # If there's a name, the role is omitted
+            num_tokens -= 1
+    return num_tokens
+
+
+def count_messages_tokens(messages, model=DEFAULT_MODEL):
+    # Every reply is primed with <im_start>assistant
+    return sum(count_message_tokens(message, model) for message in messages) + 2
+
+
+def message_token_bound(message):
+    """
+    A cheap upper bound on count_message_tokens() that needs no encoder. Every
+    token covers at least one byte, and a message's JSON is longer than its
+    values' UTF-8 bytes plus the 4 framing tokens.
+    """
+    return len(json.dumps(message))
+
+
+class TokenLedger:
+    """
+    A message list with each message's token count worked out at most once and
+    a running total. Counting is deferred until a prune could actually drop
+    something, so short histories never load the encoder at all.
+    """
+
+    def __init__(self, messages=(), model=DEFAULT_MODEL):
+        self.model = model
+        self.messages = []
+        self.counts = []  # None until the message is counted
+        self.bounds = []
+        self.bound = 2  # Every reply is primed with <im_start>assistant
+        self._total = 2
+        self._uncounted = 0
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def append(self, message):
+        self.insert(len(self.messages), message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def insert(self, index, message):
+        bound = message_token_bound(message)
+        self.messages.insert(index, message)
+        self.counts.insert(index, None)
+        self.bounds.insert(index, bound)
+        self.bound += bound
+        self._uncounted += 1
+
+    @property
+    def total(self):
+        """Exact token total, counting any messages not counted yet."""
+        # New messages are usually at the end, so look for them from there.
+        i = len(self.messages) - 1
+        while self._uncounted:
+            if self.counts[i] is None:
+                self.counts[i] = count_message_tokens(self.messages[i], self.model)
+                self._total += self.counts[i]
+                self._uncounted -= 1
+            i -= 1
+        return self._total
+
+    def prune(self, max_tokens):
+        """
+        Drop the oldest non-system messages until the total fits in max_tokens,
+        in one pass. The newest message is always kept. Returns how many were
+        dropped.
+        """
+        if self.bound <= max_tokens:
+            return 0
+        over = self.total - max_tokens
+        if over <= 0:
+            return 0
+        drop = set()
+        last = len(self.messages) - 1
+        for i, message in enumerate(self.messages):
+            if over <= 0 or i == last:
+                break
+            if message.get("role") == "system":
+                continue
+            drop.add(i)
+            over -= self.counts[i]
+        if drop:
+            kept = [i for i in range(len(self.messages)) if i not in drop]
+            self._total -= sum(self.counts[i] for i in drop)
+            self.bound -= sum(self.bounds[i] for i in drop)
+            self.messages = [self.messages[i] for i in kept]
+            self.counts = [self.counts[i] for i in kept]
+            self.bounds = [self.bounds[i] for i in kept]
+        return len(drop)
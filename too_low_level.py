@@ -2,6 +2,8 @@ import os
 import requests
 import json
 
+import transport
+
 # Get API key from environment variable
 api_key = os.environ.get("OPENAI_API_KEY")
 if not api_key:
@@ -11,6 +13,9 @@ if not api_key:
 # API endpoint
 url = "https://api.openai.com/v1/chat/completions"
 
+# One pooled session, so every request after the first reuses the connection
+session = transport.requests_session()
+
 # Headers
 headers = {
     "Content-Type": "application/json",
@@ -74,7 +79,7 @@ def make_openai_request(prompt, use_tools=False):
     
     try:
         print(f"Sending request with prompt: '{prompt}'")
-        response = requests.post(url, headers=headers, json=payload)
+        response = session.post(url, headers=headers, json=payload)
         
         # Check if request was successful
         response.raise_for_status()
@@ -0,0 +1,129 @@
+"""
+Result cache for read-only tool calls.
+
+Entries are keyed on the tool name and its validated arguments, expire after
+`ttl_seconds` and are evicted least recently used past `max_entries`. Each
+entry carries tags naming the records it was read from (say "order:24601"),
+and a write invalidates every entry with one of the tags it touched.
+
+A read that misses takes generation() before running its tool and passes it
+to put(). If a write invalidated one of the entry's tags in the meantime
+(the tool may have read the row just before the write changed it), put()
+drops the entry instead of caching a stale result.
+
+Invalidation only sees writes made through this process; the TTL bounds how
+stale an entry can get when another process writes to a shared store.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ToolResultCache:
+    def __init__(self, max_entries=10000, ttl_seconds=30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (result, tags, expiry time), least recently used first
+        self._entries = OrderedDict()
+        self._tagged = {}  # tag -> keys of the entries carrying it
+        self._generation = 0  # bumped by every invalidate() and clear()
+        self._tag_generations = {}  # tag -> generation it was last invalidated at
+        self._floor = 0  # puts that started before this can no longer be checked
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.discarded = 0
+
+    def generation(self):
+        """Take before reading from the store, and pass to put() as `since`."""
+        with self._lock:
+            return self._generation
+
+    def get(self, tool_name, key):
+        """(True, result) on a hit, (False, None) on a miss."""
+        full_key = (tool_name, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(full_key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses[tool_name] = self.misses.get(tool_name, 0) + 1
+                return False, None
+            self._entries.move_to_end(full_key)
+            self.hits[tool_name] = self.hits.get(tool_name, 0) + 1
+            return True, entry[0]
+
+    def put(self, tool_name, key, result, tags=(), since=None):
+        full_key = (tool_name, key)
+        tags = frozenset(tags)
+        with self._lock:
+            if since is not None and (since < self._floor or
+                                      any(self._tag_generations.get(tag, 0) > since for tag in tags)):
+                self.discarded += 1
+                return
+            if full_key in self._entries:
+                self._remove(full_key)
+            self._entries[full_key] = (result, tags, time.monotonic() + self.ttl_seconds)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(full_key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        """Drop every entry carrying one of `tags`; returns how many went."""
+        with self._lock:
+            self._generation += 1
+            keys = set()
+            for tag in tags:
+                self._tag_generations[tag] = self._generation
+                keys |= self._tagged.get(tag, set())
+            if len(self._tag_generations) > self.max_entries:
+                # Forget old invalidations; puts from before now are then dropped wholesale.
+                self._tag_generations.clear()
+                self._floor = self._generation
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._floor = self._generation
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tagged.clear()
+
+    def stats(self):
+        with self._lock:
+            tools = {}
+            for name in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+                tools[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4)}
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {
+                "entries": len(self._entries),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "discarded": self.discarded,
+                "tools": tools,
+            }
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
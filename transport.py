@@ -0,0 +1,144 @@
+"""
+Shared HTTP transport for the scripts in this repo.
+
+Each helper returns one long-lived client per process (per event loop for
+aiohttp), so requests reuse kept-alive connections instead of paying a TCP and
+TLS handshake every time. HTTP/2 is used for the OpenAI clients when the `h2`
+package is installed (`pip install httpx[http2]`).
+
+Pool sizes come from the environment:
+
+- HTTP_POOL_CONNECTIONS  most connections open at once (default 100)
+- HTTP_POOL_KEEPALIVE    idle connections kept for reuse (default 20)
+- HTTP_KEEPALIVE_SECONDS how long an idle connection is kept (default 30)
+"""
+import os
+from functools import lru_cache
+
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "100"))
+POOL_KEEPALIVE = int(os.environ.get("HTTP_POOL_KEEPALIVE", "20"))
+KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "30"))
+
+
+@lru_cache(maxsize=None)
+def http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=POOL_CONNECTIONS,
+        max_keepalive_connections=POOL_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+
+
+@lru_cache(maxsize=None)
+def openai_client(api_key=None):
+    """OpenAI client on a shared, pooled httpx connection pool."""
+    from openai import DefaultHttpxClient, OpenAI
+
+    http_client = DefaultHttpxClient(http2=http2_available(), limits=limits())
+    return OpenAI(api_key=api_key, http_client=http_client)
+
+
+def new_async_openai_client(api_key=None):
+    """
+    A new AsyncOpenAI client, which the caller closes before its event loop
+    ends. Uses aiohttp underneath when the `openai[aiohttp]` extra is
+    installed, since httpx's async pool slows down with hundreds of requests
+    in flight. Otherwise it uses httpx, with HTTP/2 if available.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    try:
+        import aiohttp
+        from httpx_aiohttp import AiohttpTransport
+        from openai import DefaultAioHttpClient
+
+        # The aiohttp backend does not promise to honour httpx Limits, so the
+        # pool is set on its connector, built on first use inside the loop.
+        transport = AiohttpTransport(client=lambda: aiohttp.ClientSession(connector=aiohttp_connector()))
+        http_client = DefaultAioHttpClient(transport=transport)
+    except (ImportError, RuntimeError):
+        http_client = DefaultAsyncHttpxClient(http2=http2_available(), limits=limits())
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+@lru_cache(maxsize=None)
+def async_openai_client(api_key=None):
+    """
+    One new_async_openai_client() for the whole process. Its connections
+    belong to the first event loop that uses them, so this is for programs
+    that run a single loop (a server); anything that calls asyncio.run()
+    more than once should make and close its own client.
+    """
+    return new_async_openai_client(api_key)
+
+
+async def close_async_openai_client():
+    """
+    Close the default async_openai_client(). Its connections belong to the
+    event loop that used them, so call this before that loop ends.
+    """
+    if async_openai_client.cache_info().currsize:
+        await async_openai_client().close()
+        async_openai_client.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def requests_session():
+    """requests.Session with a connection pool sized like the others."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_KEEPALIVE, pool_maxsize=POOL_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def aiohttp_connector():
+    """aiohttp connector with the pool sizes above; make it inside a running loop."""
+    import aiohttp
+
+    return aiohttp.TCPConnector(
+        limit=POOL_CONNECTIONS,
+        keepalive_timeout=KEEPALIVE_SECONDS,
+        ttl_dns_cache=300,
+    )
+
+
+_aiohttp_sessions = {}
+
+
+def aiohttp_session():
+    """
+    The aiohttp ClientSession for the running event loop. A session cannot be
+    shared across loops, so there is one per loop; close it with
+    close_aiohttp_session() before the loop ends.
+    """
+    import asyncio
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _aiohttp_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp_connector())
+        _aiohttp_sessions[loop] = session
+    return session
+
+
+async def close_aiohttp_session():
+    import asyncio
+
+    session = _aiohttp_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()